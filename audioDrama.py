@@ -1,16 +1,22 @@
 import torch
 from diffusers import AudioLDMPipeline
-import torchaudio
+import numpy as np
 import argparse
 import json
-import re
-import asyncio
-import websockets
-import base64
+import threading
 import time
-import io
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from realtimeTTS import SAMPLE_RATE, TTSClient, VERBATIM_INSTRUCTIONS, pcm_to_segment
+from pcmAssembler import PCMAssembler
+from audioSink import WavSink
+from loudness import LoudnessMeter, MeteredSink, apply_gain, loudnorm
+from ttsCache import TTSCache
+from buildDir import BuildDir, fingerprint
+from sfxLibrary import LIBRARY_DIR, SFXLibrary
 from pydub import AudioSegment
-from pydub.effects import normalize
 import os
 from typing import List, Literal, Union
 from pydantic import BaseModel
@@ -25,174 +31,145 @@ class SFXItem(BaseModel):
     type: Literal["sfx"]
     prompt: str
     duration: float = 3.0  # Default duration in seconds
+    steps: int = 20  # AudioLDM inference steps
+    seed: int = 0  # Fixed seed so a stored effect is exactly what this item would generate
+    placement: Literal["inline", "bed"] = "inline"  # A bed plays under the following lines instead of between them
+    gain_db: float = 0.0  # Level change applied when the effect is mixed in
 
 ScriptItem = Union[DialogueItem, SFXItem]
 
 class DramaScript(BaseModel):
     script: List[ScriptItem]
 
+SFX_MODEL_ID = 'cvssp/audioldm-s-full-v2'
+BED_GAIN_DB = -12.0  # Default level of a bed under dialogue
+SFX_SAMPLE_RATE = 16000
+
+# Process-wide AudioLDM pipeline, loaded on first use and reused for every effect
+_sfx_pipeline = None
+_sfx_lock = threading.Lock()
+sfx_timings = {"load": 0.0, "effects": []}
+
+def get_sfx_pipeline() -> AudioLDMPipeline:
+    global _sfx_pipeline
+    with _sfx_lock:
+        if _sfx_pipeline is None:
+            start = time.perf_counter()
+            pipe = AudioLDMPipeline.from_pretrained(SFX_MODEL_ID, torch_dtype=torch.float32)
+            _sfx_pipeline = pipe.to('cpu')  # Change to 'cuda' if GPU available
+            sfx_timings["load"] = time.perf_counter() - start
+            print(f"Loaded {SFX_MODEL_ID} in {sfx_timings['load']:.1f}s")
+        return _sfx_pipeline
+
+# Convert AudioLDM's float waveform straight to 16-bit PCM, no temp WAV round trip
+def sfx_to_segment(audio: np.ndarray) -> AudioSegment:
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16).tobytes()
+    return AudioSegment(data=pcm, sample_width=2, frame_rate=SFX_SAMPLE_RATE, channels=1)
+
+# Function to generate a batch of sound effects that share a length and step count in one diffusion call
+def generate_sfx_batch(prompts: List[str], duration: float = 3.0, steps: int = 20, seeds: List[int] = None) -> List[AudioSegment]:
+    pipe = get_sfx_pipeline()
+    generators = [torch.Generator().manual_seed(seed) for seed in (seeds or [0] * len(prompts))]
+    start = time.perf_counter()
+    audios = pipe(list(prompts), num_inference_steps=steps, audio_length_in_s=duration, generator=generators).audios
+    spent = time.perf_counter() - start
+    sfx_timings["effects"].extend([spent / len(prompts)] * len(prompts))
+    return [sfx_to_segment(audio) for audio in audios]
+
 # Function to generate sound effect using AudioLDM
-def generate_sfx(prompt: str, duration: float = 3.0, steps: int = 20) -> AudioSegment:
-    pipe = AudioLDMPipeline.from_pretrained('cvssp/audioldm-s-full-v2', torch_dtype=torch.float32)
-    pipe = pipe.to('cpu')  # Change to 'cuda' if GPU available
-    audio = pipe(prompt, num_inference_steps=steps, audio_length_in_s=duration).audios[0]
-    audio_tensor = torch.tensor([audio])
-    temp_path = 'temp_sfx.wav'
-    torchaudio.save(temp_path, audio_tensor, 16000)
-    sfx_segment = AudioSegment.from_wav(temp_path)
-    os.remove(temp_path)
-    return sfx_segment
-
-# Helper to split long text into chunks
-def split_long_text(text: str, max_chars: int = 4000):
-    if not text.strip():
-        return []
-    
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    
-    chunks = []
-    current_chunk = ""
-    
-    for sentence in sentences:
-        if len(sentence) > max_chars:
-            words = sentence.split()
-            sub_chunk = ""
-            for word in words:
-                if len(sub_chunk) + len(word) + (1 if sub_chunk else 0) > max_chars:
-                    if sub_chunk:
-                        chunks.append(sub_chunk.strip())
-                    sub_chunk = word
-                else:
-                    sub_chunk += (" " + word) if sub_chunk else word
-            if sub_chunk:
-                chunks.append(sub_chunk.strip())
-        else:
-            if len(current_chunk) + len(sentence) + (1 if current_chunk else 0) > max_chars:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence
-            else:
-                current_chunk += (" " + sentence) if current_chunk else sentence
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
-
-# Async function to generate voice audio using Grok Voice API
-async def text_to_voice_async(text: str, voice: str, api_key: str) -> AudioSegment:
-    uri = "wss://api.x.ai/v1/realtime"
-    text_chunks = split_long_text(text)
-    line_wav_segments = []
-    retry_count = 0
-    max_retries = 3
-    
-    while retry_count < max_retries:
-        try:
-            async with websockets.connect(uri, additional_headers={"Authorization": f"Bearer {api_key}"}) as websocket:
-                await websocket.recv()
-                
-                session_message = {
-                    "type": "session.update",
-                    "session": {
-                        "instructions": (
-                            "You are a verbatim TTS reader. Output ONLY the exact input text as speech. No paraphrase, improv, summary, explanation, or changes. Word-for-word exact read. "
-                            "without adding, removing, changing, or commenting on any content. Do not add introductions, "
-                            "summaries, explanations, or any extra words whatsoever. Output only the spoken audio of the text."
-                        ),
-                        "turn_detection": {"type": None},
-                        "audio": {
-                            "output": {
-                                "format": {"type": "audio/pcm", "rate": 24000}
-                            }
-                        },
-                        "voice": voice
-                    }
-                }
-                await websocket.send(json.dumps(session_message))
-                
-                while True:
-                    msg = await websocket.recv()
-                    data = json.loads(msg)
-                    if data["type"] == "session.updated":
-                        break
-                    elif data["type"] == "error":
-                        print("Error updating session:", data)
-                        raise Exception("Session update error")
-                
-                for chunk in text_chunks:
-                    text_input = {
-                        "type": "conversation.item.create",
-                        "item": {
-                            "type": "message",
-                            "role": "user",
-                            "content": [{"type": "input_text", "text": chunk}]
-                        }
-                    }
-                    await websocket.send(json.dumps(text_input))
-                    
-                    generate_message = {"type": "response.create", "response": {}}
-                    await websocket.send(json.dumps(generate_message))
-                    
-                    audio_data = b""
-                    while True:
-                        msg = await websocket.recv()
-                        data = json.loads(msg)
-                        if data["type"] == "response.output_audio.delta":
-                            audio_data += base64.b64decode(data["delta"])
-                        elif data["type"] == "response.output_audio.done":
-                            break
-                        elif data["type"] == "error":
-                            print("Error:", data)
-                            raise Exception("Audio generation error")
-                    
-                    if audio_data:
-                        segment = AudioSegment.from_raw(
-                            io.BytesIO(audio_data),
-                            sample_width=2,
-                            frame_rate=24000,
-                            channels=1
-                        )
-                        line_wav_segments.append(segment)
-                    
-                    await asyncio.sleep(0.5)
-                
-                break  # Success
-            
-        except Exception as e:
-            retry_count += 1
-            print(f"Connection error: {e}. Retrying {retry_count}/{max_retries}...")
-            await asyncio.sleep(2 ** retry_count)
-    
-    if retry_count >= max_retries:
-        raise Exception("Max retries exceeded for voice generation.")
-    
-    if line_wav_segments:
-        full_segment = line_wav_segments[0]
-        for seg in line_wav_segments[1:]:
-            full_segment = full_segment.append(seg, crossfade=50)
-        return full_segment
-    return AudioSegment.empty()
+def generate_sfx(prompt: str, duration: float = 3.0, steps: int = 20, seed: int = 0) -> AudioSegment:
+    return generate_sfx_batch([prompt], duration, steps, [seed])[0]
+
+def sfx_key(item: SFXItem):
+    return (item.prompt, item.duration, item.steps, item.seed)
+
+# Generate every effect of a script up front. Effects already in the SFX library are loaded from it,
+# identical effects are generated once, and the rest go through the UNet together, `batch_size`
+# prompts at a time, grouped by duration and step count.
+def generate_all_sfx(items: List[SFXItem], batch_size: int = 4, library: SFXLibrary = None,
+                     fuzzy: float = 0.0, any_source: bool = False) -> dict:
+    unique = list(dict.fromkeys(sfx_key(item) for item in items))
+    results = {}
+    groups = {}
+    for prompt, duration, steps, seed in unique:
+        if library is not None:
+            segment = library.lookup(prompt, duration, steps, seed, SFX_MODEL_ID, fuzzy, any_source)
+            if segment is not None:
+                results[(prompt, duration, steps, seed)] = segment
+                continue
+        groups.setdefault((duration, steps), []).append((prompt, seed))
+    for (duration, steps), pending in groups.items():
+        for i in range(0, len(pending), batch_size):
+            batch = pending[i:i+batch_size]
+            prompts = [prompt for prompt, _ in batch]
+            print(f"Generating {len(batch)} SFX ({duration}s, {steps} steps): {'; '.join(prompts)}")
+            segments = generate_sfx_batch(prompts, duration, steps, [seed for _, seed in batch])
+            for (prompt, seed), segment in zip(batch, segments):
+                results[(prompt, duration, steps, seed)] = segment
+                if library is not None:
+                    try:
+                        library.store(prompt, segment, duration, steps, seed, SFX_MODEL_ID, source="audioldm")
+                    except Exception as e:
+                        # The effect is still used for this drama, it is just not kept for the next one
+                        print(f"SFX library: could not store '{prompt}': {e}")
+    if items:
+        print(f"SFX: {len(items)} effects, {len(unique)} unique, {sum(len(p) for p in groups.values())} generated")
+        if library is not None:
+            print(f"SFX library: {library.stats()}")
+    return results
+
+def print_sfx_timings():
+    effects = sfx_timings["effects"]
+    if not effects:
+        return
+    total = sum(effects)
+    print(f"SFX: {len(effects)} effects, model load {sfx_timings['load']:.1f}s once, "
+          f"{total / len(effects):.1f}s per effect ({(total + sfx_timings['load']) / len(effects):.1f}s amortized with load)")
 
-def text_to_voice(text: str, voice: str, api_key: str) -> AudioSegment:
-    return asyncio.run(text_to_voice_async(text, voice, api_key))
+# Generate voice audio using the pooled Grok Voice client
+async def text_to_voice_async(text: str, voice: str, tts: TTSClient) -> AudioSegment:
+    out = PCMAssembler()
+    chunks = await tts.synthesize(text, voice, VERBATIM_INSTRUCTIONS, max_chars=4000)
+    for i, pcm in enumerate(pcm for pcm in chunks if pcm):
+        out.add(pcm, crossfade_ms=50 if i else 0)
+    return out.to_segment()
 
-# Parse a text file into DramaScript (assumes format: "SPEAKER: text" or "SFX: prompt ; duration")
+def text_to_voice(text: str, voice: str, tts: TTSClient) -> AudioSegment:
+    return asyncio.run(text_to_voice_async(text, voice, tts))
+
+# Runs in a worker process so CPU-bound diffusion never competes with the event loop driving TTS.
+# The worker loads its own pipeline and returns plain 24 kHz PCM so nothing heavy is pickled back.
+def sfx_worker(items: List[dict], batch_size: int = 4, library_dir: str = None, fuzzy: float = 0.0,
+               any_source: bool = False, torch_threads: int = None) -> dict:
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    library = SFXLibrary(library_dir) if library_dir else None
+    sfx = generate_all_sfx([SFXItem(**item) for item in items], batch_size, library, fuzzy, any_source)
+    print_sfx_timings()
+    return {key: segment.set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2).raw_data for key, segment in sfx.items()}
+
+# Parse a text file into DramaScript (assumes format: "SPEAKER: text" or "SFX: prompt ; duration [; bed [; gain dB]]")
 def parse_drama_script(file_path: str) -> DramaScript:
     with open(file_path, 'r') as f:
         lines = f.readlines()
     
     script_items = []
-    for line in lines:
+    for number, line in enumerate(lines, 1):
         line = line.strip()
         if not line:
             continue
         if line.startswith("SFX:"):
-            parts = line[4:].strip().split(';')
-            prompt = parts[0].strip()
-            # duration = float(parts[1].strip()) if len(parts) > 1 else 3.0
-            script_items.append(SFXItem(type="sfx", prompt=prompt, duration=3.0))
+            parts = [part.strip() for part in line[4:].split(';')]
+            prompt = parts[0]
+            placement = parts[2].lower() if len(parts) > 2 and parts[2] else "inline"
+            if placement not in ("inline", "bed"):
+                raise ValueError(f"{file_path}:{number}: unknown SFX placement {parts[2]!r}, expected 'inline' or 'bed'")
+            try:
+                duration = float(parts[1]) if len(parts) > 1 and parts[1] else 3.0
+                gain_db = float(parts[3]) if len(parts) > 3 and parts[3] else (BED_GAIN_DB if placement == "bed" else 0.0)
+            except ValueError:
+                raise ValueError(f"{file_path}:{number}: SFX duration and gain must be numbers: {line}") from None
+            script_items.append(SFXItem(type="sfx", prompt=prompt, duration=duration, placement=placement, gain_db=gain_db))
         elif ':' in line:
             speaker, text = line.split(':', 1)
             speaker = speaker.strip()
@@ -201,42 +178,122 @@ def parse_drama_script(file_path: str) -> DramaScript:
     
     return DramaScript(script=script_items)
 
-# Main function to generate audio drama
-def generate_audio_drama(script: DramaScript, api_key: str, output_path: str, voice_map: dict):
-    audio_segments = []
-    pause = AudioSegment.silent(duration=250)  # Short pause between lines
-    
-    for item in script.script:
-        if item.type == "dialogue":
-            voice = voice_map.get(item.speaker, "Ara")  # Default to Ara
+# Render every item that is not checkpointed yet. Dialogue is synthesized on the event loop (network-bound)
+# while all effects diffuse in a worker process (CPU-bound) at the same time; the timeline is then
+# written in script order as items resolve, so wall-clock time tends to max(TTS, SFX) instead of the sum.
+# Beds are mixed under the lines that follow them rather than taking up time of their own.
+async def render_timeline(script: DramaScript, tts: TTSClient, voice_map: dict, full_audio: PCMAssembler,
+                          build: BuildDir = None, sfx_options: dict = None, dialogue_concurrency: int = 4):
+    loop = asyncio.get_running_loop()
+    items = script.script
+    names = [f"item_{index}.wav" for index in range(len(items))]
+    todo = [index for index in range(len(items)) if not (build and build.is_done(names[index]))]
+    start = time.perf_counter()
+    timings = {"dialogue": 0.0, "sfx": 0.0}
+
+    def checkpoint(index: int, segment: AudioSegment) -> AudioSegment:
+        if build:
+            segment.export(build.file(names[index]), format="wav").close()
+            build.mark_done(names[index])
+        return segment
+
+    pending_sfx = [items[index] for index in todo if items[index].type == "sfx"]
+    sfx_future = None
+    executor = None
+    if pending_sfx:
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        sfx_future = loop.run_in_executor(executor, partial(sfx_worker, [item.model_dump() for item in pending_sfx], **(sfx_options or {})))
+
+    async def render_sfx(index: int) -> AudioSegment:
+        sfx = await sfx_future
+        timings["sfx"] = time.perf_counter() - start
+        return checkpoint(index, pcm_to_segment(sfx[sfx_key(items[index])]))
+
+    slots = asyncio.Semaphore(dialogue_concurrency)
+    async def render_dialogue(index: int) -> AudioSegment:
+        item = items[index]
+        voice = voice_map.get(item.speaker, "Ara")  # Default to Ara
+        async with slots:
             print(f"Generating voice for {item.speaker} ({voice}): {item.text[:50]}...")
-            voice_segment = text_to_voice(item.text, voice, api_key)
-            audio_segments.append(voice_segment)
-        elif item.type == "sfx":
-            print(f"Generating SFX: {item.prompt} ({item.duration}s)")
-            sfx_segment = generate_sfx(item.prompt, item.duration)
-            audio_segments.append(sfx_segment)
-        
-        audio_segments.append(pause)
-    
-    if audio_segments:
-        audio_segments.pop()  # Remove last pause
+            t = time.perf_counter()
+            segment = await text_to_voice_async(item.text, voice, tts)
+            timings["dialogue"] += time.perf_counter() - t
+        return checkpoint(index, segment)
+
+    tasks = {index: asyncio.ensure_future(render_dialogue(index) if items[index].type == "dialogue" else render_sfx(index))
+             for index in todo}
+    try:
+        for index in range(len(items)):
+            if index in tasks:
+                segment = await tasks[index]
+            else:
+                print(f"Item {index+1}/{len(items)} already built, skipping")
+                segment = AudioSegment.from_wav(build.file(names[index]))
+            item = items[index]
+            if item.type == "sfx" and item.placement == "bed":
+                full_audio.overlay_segment(segment, item.gain_db)
+                continue
+            if full_audio.duration_ms:
+                full_audio.add_silence(250)  # Short pause between lines
+            full_audio.add_segment(segment + item.gain_db if item.type == "sfx" and item.gain_db else segment)
+    finally:
+        for task in tasks.values():
+            task.cancel()
+        if executor:
+            # Never block the event loop on the worker: if rendering failed while SFX were still being
+            # generated, the worker process is killed instead of being waited for
+            workers = list((executor._processes or {}).values())
+            executor.shutdown(wait=False, cancel_futures=True)
+            if sfx_future.cancel():
+                for process in workers:
+                    process.terminate()
+    print(f"Rendered in {time.perf_counter() - start:.1f}s wall clock: "
+          f"{timings['dialogue']:.1f}s of voice synthesis, SFX ready after {timings['sfx']:.1f}s")
+
+# Main function to generate audio drama. With a BuildDir every rendered item is checkpointed
+# as item_{index}.wav, and items already in the manifest are loaded instead of re-rendered.
+def generate_audio_drama(script: DramaScript, tts: TTSClient, output_path: str, voice_map: dict, build: BuildDir = None,
+                         loudness: str = "peak", target_db: float = -16.0, sfx_options: dict = None,
+                         dialogue_concurrency: int = 4):
+    # Items are streamed to a WAV on disk as they are rendered and measured on the way,
+    # so normalization never needs the whole drama in memory
+    wav_path = build.file("drama.wav") if build else os.path.splitext(output_path)[0] + ".tmp.wav"
+    meter = LoudnessMeter()
+    full_audio = PCMAssembler(sink=MeteredSink(WavSink(wav_path), meter))
     
-    full_audio = AudioSegment.empty()
-    for seg in audio_segments:
-        full_audio += seg
+    asyncio.run(render_timeline(script, tts, voice_map, full_audio, build, sfx_options, dialogue_concurrency))
     
-    # Normalize audio
-    full_audio = normalize(full_audio)
+    full_audio.close()
     
-    full_audio.export(output_path, format="mp3")
+    # Normalize audio in a second streaming pass while encoding the output
+    if loudness == "lufs":
+        loudnorm(wav_path, output_path, target_db)
+    else:
+        gain = meter.gain_to_loudness(target_db) if loudness == "rms" else meter.gain_to_peak()
+        print(f"Peak {meter.peak_dbfs:.1f} dBFS, loudness {meter.loudness_db:.1f} dB, applying {gain:+.1f} dB")
+        apply_gain(wav_path, output_path, gain)
+    if not build:
+        os.remove(wav_path)
     print(f"Audio drama generated: {output_path}")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Turn audio drama script into audio with voices and SFX")
-    parser.add_argument("--input", required=True, help="Path to input script file (TXT with format SPEAKER: text or SFX: prompt ; duration)")
+    parser.add_argument("--input", required=True, help="Path to input script file (TXT with format SPEAKER: text or SFX: prompt ; duration [; bed [; gain dB]])")
     parser.add_argument("--output", default="audio_drama.mp3", help="Output audio file")
     parser.add_argument("--voice-map", default='{"Narrator": "Ara", "Female": "Ara", "Male": "Sal", "Alt Female": "Eve", "Alt Male": "Rex"}', help="JSON dict mapping speakers to voices (ara or rex)")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk TTS audio cache")
+    parser.add_argument("--loudness", choices=["peak", "rms", "lufs"], default="peak", help="Normalization: peak, gated RMS loudness, or ffmpeg loudnorm (LUFS)")
+    parser.add_argument("--target-db", type=float, default=-16.0, help="Loudness target for --loudness rms/lufs")
+    parser.add_argument("--sfx-batch-size", type=int, default=4, help="Effects diffused together in one AudioLDM call")
+    parser.add_argument("--torch-threads", type=int, help="CPU threads for AudioLDM (torch.set_num_threads)")
+    parser.add_argument("--no-sfx-library", action="store_true", help="Always diffuse effects instead of reusing the SFX library")
+    parser.add_argument("--sfx-fuzzy", type=float, default=0.0,
+                        help="Also reuse a library effect whose prompt is at least this similar, e.g. 0.9 (default: same prompt only)")
+    parser.add_argument("--sfx-any-source", action="store_true", help="Also reuse imported effects (ElevenLabs, realtime voice) of sufficient length; "
+                        "same prompt only unless --sfx-fuzzy is set")
+    parser.add_argument("--dialogue-concurrency", type=int, default=4, help="Dialogue lines synthesized at once")
+    parser.add_argument("--build-dir", help="Keep each rendered line and effect plus a manifest in this directory")
+    parser.add_argument("--resume", action="store_true", help="Skip items already completed in --build-dir")
     args = parser.parse_args()
     
     api_key = os.getenv("GROK_API_KEY")
@@ -245,4 +302,12 @@ if __name__ == "__main__":
     
     script = parse_drama_script(args.input)
     voice_map = json.loads(args.voice_map)
-    generate_audio_drama(script, api_key, args.output, voice_map)
\ No newline at end of file
+    build = None
+    if args.build_dir:
+        build = BuildDir(args.build_dir, fingerprint(script.model_dump(), voice_map), resume=args.resume)
+    with TTSClient(api_key, cache=None if args.no_cache else TTSCache()) as tts:
+        sfx_options = dict(batch_size=args.sfx_batch_size, library_dir=None if args.no_sfx_library else LIBRARY_DIR,
+                           fuzzy=args.sfx_fuzzy, any_source=args.sfx_any_source, torch_threads=args.torch_threads)
+        generate_audio_drama(script, tts, args.output, voice_map, build, args.loudness, args.target_db, sfx_options,
+                             args.dialogue_concurrency)
+        print(f"TTS sessions: {tts.stats()}")
\ No newline at end of file
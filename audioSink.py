@@ -0,0 +1,65 @@
+import os
+import subprocess
+import wave
+
+SAMPLE_RATE = 24000
+
+# Output sinks take mono s16 PCM as it is produced, so the finished file never has to exist in RAM.
+
+# Appends frames straight to a WAV file; the header sizes are patched once, on close
+class WavSink:
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE):
+        self.path = path
+        self.sample_rate = sample_rate
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(1)
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(sample_rate)
+
+    def write(self, pcm: bytes):
+        self._wav.writeframesraw(pcm)
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._wav = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# Pipes frames into one long-lived ffmpeg encoder process (mp3 or anything else ffmpeg can write)
+class FfmpegSink:
+    def __init__(self, path: str, sample_rate: int = SAMPLE_RATE, format: str = None, extra_args=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        format = format or os.path.splitext(path)[1].lstrip(".") or "mp3"
+        cmd = ["ffmpeg", "-y", "-loglevel", "error", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1", "-i", "pipe:0"]
+        cmd += list(extra_args or []) + ["-f", format, path]
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self, pcm: bytes):
+        self._proc.stdin.write(pcm)
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._proc.stdin.close()
+        code = self._proc.wait()
+        self._proc = None
+        if code != 0:
+            raise RuntimeError(f"ffmpeg exited with {code} while writing {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_sink(path: str, sample_rate: int = SAMPLE_RATE, format: str = None):
+    format = format or os.path.splitext(path)[1].lstrip(".").lower()
+    if format == "wav":
+        return WavSink(path, sample_rate)
+    return FfmpegSink(path, sample_rate, format)
@@ -0,0 +1,59 @@
+import importlib
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# Loads the heavy parts of a program (ML models, API clients, big imports) on background threads so
+# the cheap parts can start right away. Each component is a name plus a loader; get() waits for it only
+# if it is not ready yet. Every load is timed for --profile-startup style reports.
+class BackgroundLoader:
+    def __init__(self, workers: int = 1, started: float = None):
+        self.started = started or time.perf_counter()
+        self.timings = {}
+        self._futures = {}
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup")
+
+    def _timed(self, name: str, loader):
+        start = time.perf_counter()
+        try:
+            return loader()
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = seconds
+
+    # Load on the calling thread (for what is needed before anything else can run)
+    def load_now(self, name: str, loader):
+        future = Future()
+        future.set_result(self._timed(name, loader))
+        self._futures[name] = future
+        return future.result()
+
+    def load_later(self, name: str, loader):
+        self._futures[name] = self._executor.submit(self._timed, name, loader)
+
+    def import_later(self, module: str):
+        self.load_later(f"import {module}", lambda: importlib.import_module(module))
+
+    def ready(self, name: str) -> bool:
+        return self._futures[name].done()
+
+    def get(self, name: str):
+        future = self._futures[name]
+        if not future.done():
+            print(f"Waiting for {name} to finish loading...")
+        return future.result()
+
+    def wait_all(self):
+        for future in list(self._futures.values()):
+            future.exception()
+
+    def report(self):
+        print(f"Startup profile ({time.perf_counter() - self.started:.1f}s since start):")
+        for name, seconds in sorted(self.timings.items(), key=lambda item: item[1], reverse=True):
+            print(f"  {seconds:7.2f}s  {name}")
+
+    # Print the report once every component has loaded, without blocking the caller
+    def report_when_ready(self):
+        threading.Thread(target=lambda: (self.wait_all(), self.report()), name="startup-report", daemon=True).start()
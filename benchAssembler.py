@@ -0,0 +1,71 @@
+import argparse
+import time
+import numpy as np
+from pcmAssembler import PCMAssembler, SAMPLE_RATE
+
+# Feeds a synthetic stream of TTS-sized chunks (with crossfades and pauses) through PCMAssembler and
+# reports the average cost per chunk over each window of the output. Flat numbers mean appends do not
+# get slower as the assembled audio grows. --bed-every schedules a 30 s ambience overlay every N chunks
+# to show that mixing beds stays flat too. --pydub-minutes runs the old `full_audio += seg` approach
+# on a shorter stream for comparison.
+
+def synthetic_chunk(seconds: float, rng) -> bytes:
+    return (rng.standard_normal(int(SAMPLE_RATE * seconds)) * 2000).astype(np.int16).tobytes()
+
+def bench_assembler(minutes: float, chunk_seconds: float, window_minutes: float, bed_every: int = 0):
+    rng = np.random.default_rng(0)
+    chunk = synthetic_chunk(chunk_seconds, rng)
+    bed = synthetic_chunk(30.0, rng)
+    out = PCMAssembler()
+    windows = []
+    window_start, window_chunks, window_time = 0.0, 0, 0.0
+    while out.duration_ms < minutes * 60000:
+        start = time.perf_counter()
+        if bed_every and window_chunks % bed_every == 0:
+            out.overlay(bed, gain_db=-12)
+        out.add(chunk, crossfade_ms=50)
+        out.add_silence(250)
+        window_time += time.perf_counter() - start
+        window_chunks += 1
+        if out.duration_ms >= (window_start + window_minutes) * 60000:
+            windows.append((window_start, window_chunks, window_time))
+            window_start += window_minutes
+            window_chunks, window_time = 0, 0.0
+    for start_min, chunks, spent in windows:
+        print(f"  {start_min:6.0f}-{start_min + window_minutes:.0f} min: {1e6 * spent / chunks:8.1f} us/chunk ({chunks} chunks)")
+    return out
+
+def bench_pydub(minutes: float, chunk_seconds: float):
+    from pydub import AudioSegment
+    rng = np.random.default_rng(0)
+    seg = AudioSegment(data=synthetic_chunk(chunk_seconds, rng), sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+    pause = AudioSegment.silent(duration=250, frame_rate=SAMPLE_RATE)
+    full_audio = AudioSegment.empty()
+    first = last = None
+    count = 0
+    while len(full_audio) < minutes * 60000:
+        start = time.perf_counter()
+        full_audio = full_audio.append(seg, crossfade=50) if len(full_audio) else seg
+        full_audio += pause
+        spent = time.perf_counter() - start
+        first = spent if first is None else first
+        last = spent
+        count += 1
+    print(f"  pydub: first chunk {1e6 * first:.1f} us, chunk {count} {1e6 * last:.1f} us")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark PCMAssembler per-chunk cost on a long synthetic stream")
+    parser.add_argument("--minutes", type=float, default=120.0)
+    parser.add_argument("--chunk-seconds", type=float, default=8.0)
+    parser.add_argument("--window-minutes", type=float, default=10.0)
+    parser.add_argument("--bed-every", type=int, default=0, help="Overlay a 30 s bed every N chunks")
+    parser.add_argument("--pydub-minutes", type=float, default=0.0, help="Also time pydub concatenation for this many minutes")
+    args = parser.parse_args()
+
+    print(f"PCMAssembler, {args.minutes:.0f} minutes of {args.chunk_seconds}s chunks:")
+    start = time.perf_counter()
+    out = bench_assembler(args.minutes, args.chunk_seconds, args.window_minutes, args.bed_every)
+    print(f"  total {time.perf_counter() - start:.2f}s for {out.duration_ms / 60000:.1f} minutes of audio")
+    if args.pydub_minutes:
+        print(f"pydub AudioSegment, {args.pydub_minutes:.0f} minutes:")
+        bench_pydub(args.pydub_minutes, args.chunk_seconds)
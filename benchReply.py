@@ -0,0 +1,79 @@
+import argparse
+import os
+import time
+from types import SimpleNamespace
+from realtimeTTS import SAMPLE_RATE, TTSClient
+from streamingReply import PCMPlayer, ReplySpeaker, stream_chat
+
+# Measures time-to-first-audio of a spoken reply, streamed sentence by sentence versus the old
+# synthesize-everything-then-play path. Chat tokens come from a scripted stand-in for the chat API and
+# audio from fakeRealtimeServer.py, so no keys are needed:
+#   python fakeRealtimeServer.py &
+#   GROK_REALTIME_URI=ws://localhost:8765 python benchReply.py
+
+REPLY = ("Sure, I started the podcast in the background. It should take about ten minutes. "
+         "I will use the paper in the current directory and save it as mpcPod.mp3. "
+         "You can ask me to play it once it is done. Anything else?")
+
+# Yields the reply word by word in the shape of an OpenAI streaming response
+class ScriptedChat:
+    def __init__(self, text: str, first_token_delay: float, token_delay: float):
+        self.text = text
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **request):
+        time.sleep(self.first_token_delay)
+        for word in self.text.split(" "):
+            time.sleep(self.token_delay)
+            delta = SimpleNamespace(content=word + " ", tool_calls=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+# Stands in for a sound card: blocks for as long as the audio would take to play
+class FakeOutputStream:
+    def __init__(self, sample_rate: int = SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.samples = 0
+
+    def write(self, pcm: bytes):
+        self.samples += len(pcm) // 2
+        time.sleep(len(pcm) / 2 / self.sample_rate)
+
+def bench_streaming(chat: ScriptedChat, tts: TTSClient, voice: str):
+    player = PCMPlayer(FakeOutputStream())
+    speaker = ReplySpeaker(tts, player, voice)
+    start = time.perf_counter()
+    stream_chat(chat, [], on_text=speaker.feed)
+    text_done = time.perf_counter()
+    speaker.finish()
+    end = time.perf_counter()
+    speaker.close()
+    player.close()
+    return player.first_audio_at - start, text_done - start, end - start
+
+def bench_batch(chat: ScriptedChat, tts: TTSClient, voice: str):
+    player = PCMPlayer(FakeOutputStream())
+    start = time.perf_counter()
+    text, _ = stream_chat(chat, [])
+    text_done = time.perf_counter()
+    player.write(b"".join(tts.synthesize_sync(text, voice)))
+    player.drain()
+    end = time.perf_counter()
+    player.close()
+    return player.first_audio_at - start, text_done - start, end - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time-to-first-audio of streamed vs. batch spoken replies")
+    parser.add_argument("--first-token-delay", type=float, default=0.3, help="Seconds before the first chat token")
+    parser.add_argument("--token-delay", type=float, default=0.03, help="Seconds between chat tokens (words)")
+    parser.add_argument("--voice", default="ara")
+    args = parser.parse_args()
+
+    chat = ScriptedChat(REPLY, args.first_token_delay, args.token_delay)
+    with TTSClient(os.getenv("GROK_API_KEY", "test")) as tts:
+        tts.synthesize_sync("Warm up.", args.voice)  # Open the session so both runs start warm
+        for name, bench in (("streamed", bench_streaming), ("batch", bench_batch)):
+            first_audio, text_done, end = bench(chat, tts, args.voice)
+            print(f"{name:>8}: first audio {first_audio:.2f}s, reply text done {text_done:.2f}s, playback done {end:.2f}s")
+        print(f"TTS sessions: {tts.stats()}")
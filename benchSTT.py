@@ -0,0 +1,82 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import re
+import resource
+import time
+from pydub import AudioSegment
+from sttBackend import BACKENDS, make_stt
+from voiceActivity import pcm_to_float32
+
+# Compares STT backends and model sizes on a fixed local clip set: a directory of audio files, each with
+# a reference transcript next to it (query1.wav + query1.txt). Reports load time, real-time factor
+# (transcription time / audio length, lower is better), peak memory and word error rate. Every
+# configuration runs in a fresh process so load times and memory are not shared between them.
+#   python benchSTT.py --clips clips/ --backends whisper faster-whisper --models base large-v3-turbo
+
+SAMPLE_RATE = 16000
+
+def load_clips(directory: str):
+    clips = []
+    for path in sorted(glob.glob(os.path.join(directory, "*"))):
+        reference = os.path.splitext(path)[0] + ".txt"
+        if path.endswith(".txt") or not os.path.exists(reference):
+            continue
+        segment = AudioSegment.from_file(path).set_frame_rate(SAMPLE_RATE).set_channels(1).set_sample_width(2)
+        with open(reference) as f:
+            clips.append((os.path.basename(path), pcm_to_float32(segment.raw_data), f.read()))
+    return clips
+
+def normalize_words(text: str):
+    return re.sub(r"[^a-z0-9'\s]", " ", text.lower()).split()
+
+# Word-level edit distance; returns (errors, reference word count)
+def word_errors(reference: str, hypothesis: str):
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    row = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        previous, row[0] = row[0], i
+        for j, hyp_word in enumerate(hyp, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (ref_word != hyp_word))
+    return row[-1], len(ref)
+
+def run_config(backend: str, model: str, clip_dir: str, language: str) -> dict:
+    clips = load_clips(clip_dir)
+    start = time.perf_counter()
+    stt = make_stt(backend, model)
+    load = time.perf_counter() - start
+    stt.transcribe(clips[0][1][:SAMPLE_RATE], language)  # Warm-up so one-time setup is not counted in the RTF
+    audio_seconds, spent, errors, words = 0.0, 0.0, 0, 0
+    for name, audio, reference in clips:
+        start = time.perf_counter()
+        text = stt.transcribe(audio, language)
+        spent += time.perf_counter() - start
+        audio_seconds += len(audio) / SAMPLE_RATE
+        clip_errors, clip_words = word_errors(reference, text)
+        errors += clip_errors
+        words += clip_words
+    return {"load": load, "rtf": spent / audio_seconds, "wer": errors / max(words, 1),
+            "memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, "clips": len(clips)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark STT backends: real-time factor, memory and WER")
+    parser.add_argument("--clips", required=True, help="Directory of audio clips with matching .txt transcripts")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--models", nargs="+", default=["base", "small", "large-v3-turbo"])
+    parser.add_argument("--language", default="en")
+    args = parser.parse_args()
+
+    if not load_clips(args.clips):
+        raise SystemExit(f"No clips with transcripts in {args.clips}")
+    context = multiprocessing.get_context("spawn")
+    print(f"{'backend':<16} {'model':<16} {'load s':>7} {'RTF':>6} {'WER':>6} {'peak MB':>8}")
+    for backend in args.backends:
+        for model in args.models:
+            with context.Pool(1) as pool:
+                try:
+                    result = pool.apply(run_config, (backend, model, args.clips, args.language))
+                except Exception as e:
+                    print(f"{backend:<16} {model:<16} failed: {e}")
+                    continue
+            print(f"{backend:<16} {model:<16} {result['load']:7.1f} {result['rtf']:6.3f} {result['wer']:6.1%} {result['memory_mb']:8.0f}")
@@ -0,0 +1,55 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+# A build directory keeps every intermediate artifact (scripts, rendered parts) plus a manifest of what
+# finished, so a --resume run can skip completed work after a crash instead of paying for it again.
+class BuildDir:
+    def __init__(self, path: str, fingerprint: str, resume: bool = False):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.manifest_path = os.path.join(path, "manifest.json")
+        if resume and os.path.exists(self.manifest_path):
+            with open(self.manifest_path) as f:
+                self.manifest = json.load(f)
+            if self.manifest.get("fingerprint") != fingerprint:
+                raise ValueError(f"{path} was built from a different input; use a new --build-dir or drop --resume")
+        else:
+            self.manifest = {"fingerprint": fingerprint, "done": {}}
+            self._write_manifest()
+
+    def file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def is_done(self, name: str) -> bool:
+        with self._lock:
+            done = name in self.manifest["done"]
+        return done and os.path.exists(self.file(name))
+
+    def mark_done(self, name: str):
+        with self._lock:
+            self.manifest["done"][name] = time.time()
+            self._write_manifest()
+
+    def save_json(self, name: str, data):
+        tmp_path = self.file(name) + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.file(name))
+        self.mark_done(name)
+
+    def load_json(self, name: str):
+        with open(self.file(name)) as f:
+            return json.load(f)
+
+    def _write_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+def fingerprint(*parts) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
@@ -0,0 +1,129 @@
+import threading
+from typing import Callable, List, Optional
+
+# Chat history with a token budget. Tool outputs are truncated when they are added, and once the
+# history outgrows the budget the oldest whole turns are folded into a running summary on a background
+# thread (the conversation carries on meanwhile), so the prompt sent with every request stays roughly flat.
+# Token counts are estimated at ~4 characters per token, which is close enough for budgeting.
+
+CHARS_PER_TOKEN = 4
+SUMMARY_PROMPT = ("Summarize this conversation between a user and a voice assistant for the assistant's own memory. "
+                  "Keep facts, file names, paths, commands that were run and their outcomes, and open requests. "
+                  "Be brief and write plain sentences.")
+
+def estimate_tokens(message: dict) -> int:
+    size = len(message.get("content") or "")
+    for call in message.get("tool_calls") or []:
+        size += len(call["function"]["name"]) + len(call["function"]["arguments"])
+    return size // CHARS_PER_TOKEN + 4
+
+def truncate_middle(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    return f"{text[:head]}\n...[{len(text) - max_chars} characters truncated]...\n{text[len(text) - tail:]}"
+
+# Plain-text transcript of some turns, used as the input of the summary request
+def render_turns(messages: List[dict], max_tool_chars: int = 500) -> str:
+    lines = []
+    for message in messages:
+        if message["role"] == "tool":
+            lines.append(f"tool {message.get('name', '')} returned: {truncate_middle(message['content'], max_tool_chars)}")
+            continue
+        if message.get("content"):
+            lines.append(f"{message['role']}: {message['content']}")
+        for call in message.get("tool_calls") or []:
+            lines.append(f"assistant called {call['function']['name']}({call['function']['arguments']})")
+    return "\n".join(lines)
+
+# Summarizer backed by a chat model; get_client is called lazily so the client can still be loading
+def chat_summarizer(get_client: Callable, model: str = "grok-4-1-fast") -> Callable[[List[dict], str], str]:
+    def summarize(messages: List[dict], previous: str) -> str:
+        transcript = render_turns(messages)
+        if previous:
+            transcript = f"Earlier summary: {previous}\n{transcript}"
+        response = get_client().chat.completions.create(model=model, messages=[
+            {"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": transcript}])
+        return response.choices[0].message.content.strip()
+    return summarize
+
+class ConversationMemory:
+    def __init__(self, system_prompt: str, budget_tokens: int = 6000, max_tool_chars: int = 4000,
+                 summarize: Optional[Callable[[List[dict], str], str]] = None):
+        self.system_prompt = system_prompt
+        self.budget_tokens = budget_tokens
+        self.max_tool_chars = max_tool_chars
+        self.summarize = summarize
+        self.summary = ""
+        self.summarized = 0  # Messages folded into the summary so far
+        self._turns = []
+        self._lock = threading.Lock()
+        self._compacting = None
+
+    def append(self, message: dict):
+        if message["role"] == "tool":
+            message = dict(message, content=truncate_middle(message["content"], self.max_tool_chars))
+        with self._lock:
+            self._turns.append(message)
+
+    # The prompt for the next request: system prompt, summary of older turns, then recent turns verbatim
+    @property
+    def messages(self) -> List[dict]:
+        with self._lock:
+            prefix = [{"role": "system", "content": self.system_prompt}]
+            if self.summary:
+                prefix.append({"role": "system", "content": f"Summary of the earlier conversation: {self.summary}"})
+            return prefix + list(self._turns)
+
+    def prompt_tokens(self) -> int:
+        return sum(estimate_tokens(message) for message in self.messages)
+
+    def stats(self) -> str:
+        with self._lock:
+            turns = len(self._turns)
+        return f"~{self.prompt_tokens()} prompt tokens, {turns} recent messages, {self.summarized} summarized"
+
+    # Oldest messages to fold so that what is left fits in half the budget. Cuts only before a user
+    # message, so an assistant tool call is never separated from its tool results, and never touches
+    # the latest user turn.
+    def _split_point(self) -> int:
+        with self._lock:
+            turns = list(self._turns)
+        total = sum(estimate_tokens(message) for message in turns)
+        if total <= self.budget_tokens:
+            return 0
+        starts = [i for i, message in enumerate(turns) if message["role"] == "user" and i > 0]
+        cut = 0
+        for start in starts:
+            cut = start
+            if sum(estimate_tokens(message) for message in turns[cut:]) <= self.budget_tokens // 2:
+                break
+        return cut
+
+    def _compact(self, count: int):
+        with self._lock:
+            old = self._turns[:count]
+            previous = self.summary
+        try:
+            summary = self.summarize(old, previous) if self.summarize else ""
+        except Exception as e:
+            print(f"Memory: summarizing failed ({e}); dropping the oldest turns instead")
+            summary = ""
+        if not summary:
+            summary = (previous + " " + render_turns([m for m in old if m["role"] == "user"], 0)).strip()
+            summary = truncate_middle(summary, self.budget_tokens * CHARS_PER_TOKEN // 4)
+        with self._lock:
+            self._turns = self._turns[count:]
+            self.summary = summary
+            self.summarized += count
+        print(f"Memory: folded {count} messages into the summary ({self.stats()})")
+
+    # Start folding old turns into the summary if the history is over budget; returns right away
+    def compact_in_background(self):
+        if self._compacting is not None and self._compacting.is_alive():
+            return
+        count = self._split_point()
+        if count:
+            self._compacting = threading.Thread(target=self._compact, args=(count,), name="memory-compact", daemon=True)
+            self._compacting.start()
@@ -0,0 +1,74 @@
+import argparse
+import asyncio
+import base64
+import json
+import math
+import struct
+import time
+import websockets
+
+# Local stand-in for wss://api.x.ai/v1/realtime. Run it, then point the scripts at it with
+#   GROK_REALTIME_URI=ws://localhost:8765 python extractAudio.py
+# Each response is a quiet tone whose length scales with the input text.
+
+SAMPLE_RATE = 24000
+
+def tone_pcm(seconds: float, freq: float = 440.0) -> bytes:
+    count = int(SAMPLE_RATE * seconds)
+    return struct.pack(f"<{count}h", *(int(3000 * math.sin(2 * math.pi * freq * i / SAMPLE_RATE)) for i in range(count)))
+
+async def handler(websocket, args, stats):
+    stats["connects"] += 1
+    await asyncio.sleep(args.connect_delay)
+    await websocket.send(json.dumps({"type": "conversation.created"}))
+    pending_text = ""
+    items = set()
+    async for msg in websocket:
+        data = json.loads(msg)
+        if data["type"] == "session.update":
+            await asyncio.sleep(args.handshake_delay)
+            await websocket.send(json.dumps({"type": "session.updated", "session": data["session"]}))
+        elif data["type"] == "conversation.item.create":
+            pending_text = data["item"]["content"][0]["text"]
+            item_id = f"item_{stats['items']}"
+            stats["items"] += 1
+            items.add(item_id)
+            await websocket.send(json.dumps({"type": "conversation.item.created", "item": {"id": item_id}}))
+        elif data["type"] == "conversation.item.delete":
+            items.discard(data["item_id"])
+            await websocket.send(json.dumps({"type": "conversation.item.deleted", "item_id": data["item_id"]}))
+        elif data["type"] == "response.create":
+            stats["responses"] += 1
+            output_id = f"item_{stats['items']}"
+            stats["items"] += 1
+            items.add(output_id)
+            await websocket.send(json.dumps({"type": "response.created"}))
+            await websocket.send(json.dumps({"type": "response.output_item.added", "item": {"id": output_id}}))
+            pcm = tone_pcm(min(len(pending_text) * args.seconds_per_char, 30.0))
+            await asyncio.sleep(args.first_delta_delay)
+            for i in range(0, len(pcm), args.delta_bytes):
+                delta = base64.b64encode(pcm[i:i + args.delta_bytes]).decode()
+                await websocket.send(json.dumps({"type": "response.output_audio.delta", "delta": delta}))
+                await asyncio.sleep(args.delta_delay)
+            await websocket.send(json.dumps({"type": "response.output_audio.done"}))
+            await websocket.send(json.dumps({"type": "response.done", "response": {"output": [{"id": output_id}]}}))
+            print(f"{time.strftime('%H:%M:%S')} connects={stats['connects']} responses={stats['responses']} "
+                  f"items in conversation={len(items)} text={pending_text[:40]!r}")
+
+async def main():
+    parser = argparse.ArgumentParser(description="Fake Grok realtime TTS server for local testing")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--connect-delay", type=float, default=0.3, help="Seconds before the first server event")
+    parser.add_argument("--handshake-delay", type=float, default=0.3, help="Seconds to answer session.update")
+    parser.add_argument("--first-delta-delay", type=float, default=0.2, help="Seconds before the first audio delta")
+    parser.add_argument("--delta-delay", type=float, default=0.01, help="Seconds between audio deltas")
+    parser.add_argument("--delta-bytes", type=int, default=9600)
+    parser.add_argument("--seconds-per-char", type=float, default=0.06)
+    args = parser.parse_args()
+    stats = {"connects": 0, "responses": 0, "items": 0}
+    async with websockets.serve(lambda ws: handler(ws, args, stats), "localhost", args.port):
+        print(f"Fake realtime server on ws://localhost:{args.port}")
+        await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(main())
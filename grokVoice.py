@@ -1,22 +1,46 @@
+import time
+STARTUP = time.perf_counter()
+import argparse
 import pvporcupine
 import pyaudio
 import struct
 import subprocess
 import os
-import wave
 import json
-import io
-import time
-import torch
-import whisper
-import numpy as np
-from pydub import AudioSegment
-from openai import OpenAI
-from ddgs import DDGS
-import asyncio
-import websockets
-import base64
+import queue
 import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from pydub import AudioSegment
+from realtimeTTS import SAMPLE_RATE as TTS_SAMPLE_RATE, TTSClient, TTSError, pcm_to_segment
+from streamingReply import PCMPlayer, ReplySpeaker, stream_chat
+from voiceActivity import Endpointer, make_vad, pcm_to_float32
+from sttBackend import BACKENDS, DEFAULT_BACKEND, DEFAULT_MODEL, make_stt
+from streamingSTT import StreamingTranscriber
+from loudness import normalize_pcm
+from backgroundLoader import BackgroundLoader
+from conversationMemory import ConversationMemory, chat_summarizer
+from searchCache import SearchCache
+from jobManager import JobManager
+CORE_IMPORTS = time.perf_counter() - STARTUP
+# --- CLI ---
+parser = argparse.ArgumentParser(description="Grapefruit voice assistant")
+parser.add_argument("--no-stream", action="store_true", help="Wait for the full reply before synthesizing and playing it")
+parser.add_argument("--vad", choices=["energy", "webrtc"], default="energy", help="Voice activity detector for endpointing (webrtc needs webrtcvad)")
+parser.add_argument("--trailing-silence-ms", type=int, default=700, help="Stop recording after this much silence")
+parser.add_argument("--max-record-seconds", type=float, default=10.0, help="Longest query recorded after the wake word")
+parser.add_argument("--stt", choices=BACKENDS, default=DEFAULT_BACKEND, help="Speech-to-text backend (faster-whisper runs int8 on CPU)")
+parser.add_argument("--stt-model", default=DEFAULT_MODEL, help="Whisper model size or path")
+parser.add_argument("--no-partials", action="store_true", help="Transcribe only after recording ends instead of while the user speaks")
+parser.add_argument("--eager", action="store_true", help="Load every model before listening instead of in the background")
+parser.add_argument("--profile-startup", action="store_true", help="Report import and load time per component")
+parser.add_argument("--memory-tokens", type=int, default=6000, help="Conversation history budget before older turns are summarized")
+parser.add_argument("--max-tool-chars", type=int, default=4000, help="Tool output kept in the conversation per call")
+parser.add_argument("--tool-timeout", type=float, default=15.0, help="Seconds one tool call may take")
+parser.add_argument("--turn-deadline", type=float, default=45.0, help="Seconds all tool calls of one user turn may take together")
+parser.add_argument("--search-ttl", type=float, default=600.0, help="Seconds a web search result is reused")
+parser.add_argument("--debug-search", action="store_true", help="Log search cache hits, misses and lookup latency")
+parser.add_argument("--max-heavy-jobs", type=int, default=1, help="Heavy background jobs (podcast.py, extractAudio.py, ...) run at once; the rest queue")
+cli = parser.parse_args()
 # --- DIRECTORY CONFIG ---
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 CURRENT_WDR = os.getcwd()
@@ -33,6 +57,7 @@ CUSTOM_INSTRUCTIONS = """
    - generating scripts (generateScript.py)
    - creating podcasts (podcast.py)
    - downloading large files
+   Each one becomes a numbered job. Use list_jobs, job_status and cancel_job to check on or stop them.
 ## specific Workflows
 - **Download/Read Papers**:
   1. Download PDF (wget).
@@ -52,10 +77,18 @@ PORCUPINE_ACCESS_KEY = os.getenv("PORCUPINE_ACCESS_KEY")
 XAI_API_KEY = os.getenv("GROK_API_KEY")
 WAKE_WORD = "grapefruit"
 SAMPLE_RATE = 16000
-RECORD_SECONDS = 10
 # --- MODELS ---
-client = OpenAI(api_key=XAI_API_KEY, base_url="https://api.x.ai/v1")
-whisper_model = whisper.load_model("large-v3-turbo", device="cpu")
+# Loaded one after another on a background thread while the wake word loop is already listening
+STT_MODULES = {"whisper": "whisper", "faster-whisper": "faster_whisper"}
+def load_chat_client():
+    from openai import OpenAI
+    return OpenAI(api_key=XAI_API_KEY, base_url="https://api.x.ai/v1")
+loader = BackgroundLoader(started=STARTUP)
+loader.record("core imports", CORE_IMPORTS)
+loader.import_later(STT_MODULES[cli.stt])
+loader.load_later("stt model", lambda: make_stt(cli.stt, cli.stt_model))
+loader.load_later("chat client", load_chat_client)
+loader.import_later("ddgs")
 # --- TOOLS ---
 tools = [
     {
@@ -84,129 +117,186 @@ tools = [
                 "required": ["query"]
             }
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "read_page",
+            "description": "Reads the text of a web page, e.g. a web_search result (usually already fetched).",
+            "parameters": {
+                "type": "object",
+                "properties": {"url": {"type": "string"}},
+                "required": ["url"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "list_jobs",
+            "description": "Lists background jobs started with run_in_background and their status.",
+            "parameters": {"type": "object", "properties": {}}
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "job_status",
+            "description": "Shows the status and the last lines of output of one background job.",
+            "parameters": {
+                "type": "object",
+                "properties": {"job_id": {"type": "integer"}},
+                "required": ["job_id"]
+            }
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "cancel_job",
+            "description": "Stops a running or queued background job.",
+            "parameters": {
+                "type": "object",
+                "properties": {"job_id": {"type": "integer"}},
+                "required": ["job_id"]
+            }
+        }
     }
 ]
 # --- HANDLERS ---
-def run_bash(command, run_in_background=False):
+def run_bash(command, run_in_background=False, timeout=15):
     print(f"Terminal >> [Background: {run_in_background}] {command}")
     if run_in_background:
-        try:
-            subprocess.Popen(command, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
-            return "Background process started."
-        except:
-            return "Failed to start."
+        job = jobs.start(command, CURRENT_WDR)
+        if job.status == "queued":
+            return f"Background job {job.id} queued; it starts when the running heavy job finishes."
+        return f"Background job {job.id} started." if job.status == "running" else "Failed to start."
     else:
         try:
-            result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=15)
+            result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=timeout)
             output = result.stdout or result.stderr
             return output or "Done."
         except:
             return "Error."
+search_cache = SearchCache(lambda: loader.get("import ddgs").DDGS(), ttl=cli.search_ttl, debug=cli.debug_search)
 def run_web_search(query):
     print(f"Web >> {query}")
     try:
-        return json.dumps(DDGS().text(query, max_results=3))
+        return json.dumps(search_cache.search(query, max_results=3))
+    except Exception as e:
+        return f"Error: {str(e)}"
+def run_read_page(url):
+    print(f"Page >> {url}")
+    try:
+        return search_cache.page(url)
     except Exception as e:
         return f"Error: {str(e)}"
+# --- BACKGROUND JOBS ---
+# Finished heavy jobs and failures are announced by voice from the main loop, between turns
+announcements = queue.Queue()
+def job_label(job):
+    script = re.search(r"[\w./-]+\.py\b", job.command)
+    return os.path.basename(script.group(0)) if script else job.command.split()[0]
+def on_job_finished(job):
+    if job.status == "failed":
+        announcements.put(f"Background job {job.id}, {job_label(job)}, failed.")
+    elif job.status == "done" and job.heavy:
+        announcements.put(f"Background job {job.id}, {job_label(job)}, is done.")
+jobs = JobManager(max_heavy=cli.max_heavy_jobs, on_finish=on_job_finished)
+def run_job_tool(name, tool_args):
+    if name == "list_jobs":
+        return "\n".join(job.describe() for job in jobs.list()) or "No background jobs."
+    job = jobs.get(tool_args["job_id"])
+    if job is None:
+        return f"No job {tool_args['job_id']}."
+    if name == "job_status":
+        return f"{job.describe()}\nLog {job.log_path}:\n{jobs.tail(job)}"
+    return f"Cancelled job {job.id}." if jobs.cancel(job.id) else f"Job {job.id} is not running ({job.status})."
+def run_tool(name, arguments):
+    try:
+        tool_args = json.loads(arguments or "{}")
+    except json.JSONDecodeError:
+        return f"Error: invalid arguments for {name}."
+    if name == "execute_bash":
+        return run_bash(tool_args["command"], tool_args.get("run_in_background", False), cli.tool_timeout)
+    elif name == "web_search":
+        return run_web_search(tool_args["query"])
+    elif name == "read_page":
+        return run_read_page(tool_args["url"])
+    elif name in ("list_jobs", "job_status", "cancel_job"):
+        return run_job_tool(name, tool_args)
+    return f"Error: unknown tool {name}."
+# All tool calls of one assistant message run at once; results come back in the original order.
+# A call still running at its timeout (or at the turn deadline) is reported as timed out and left to finish.
+tool_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool")
+def run_tool_calls(tool_calls, deadline):
+    start = time.perf_counter()
+    # Once the turn deadline has passed, calls are not started at all, so nothing runs behind the model's back
+    futures = [None if time.perf_counter() >= deadline else
+               tool_pool.submit(run_tool, tool["function"]["name"], tool["function"]["arguments"]) for tool in tool_calls]
+    results = []
+    for tool, future in zip(tool_calls, futures):
+        if future is None:
+            results.append(f"Error: turn deadline reached, {tool['function']['name']} was not run.")
+            continue
+        try:
+            results.append(future.result(timeout=max(0.0, min(start + cli.tool_timeout, deadline) - time.perf_counter())))
+        except FutureTimeout:
+            results.append(f"Error: {tool['function']['name']} did not finish in time and may still be running; "
+                           "check its effects before running it again.")
+        except Exception as e:
+            # Missing or malformed arguments (KeyError, ValueError, ...) go back to the model instead of ending the loop
+            results.append(f"Error: {e!r}")
+    print(f"Ran {len(tool_calls)} tool calls in {time.perf_counter() - start:.1f}s")
+    return results
 # --- SYSTEM PROMPT ---
 SYSTEM_MSG = f"""You are Grapefruit, an automated assistant.
 CURRENT DIRECTORY: {CURRENT_WDR}
 {CUSTOM_INSTRUCTIONS}
 """
 # --- Grok Realtime TTS Functions ---
-def split_long_text(text: str, max_chars: int = 1000):
-    if not text.strip():
-        return []
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    sentences = [s.strip() for s in sentences if s.strip()]
-    chunks = []
-    current_chunk = ""
-    for sentence in sentences:
-        if len(sentence) > max_chars:
-            words = sentence.split()
-            sub_chunk = ""
-            for word in words:
-                if len(sub_chunk) + len(word) + (1 if sub_chunk else 0) > max_chars:
-                    if sub_chunk:
-                        chunks.append(sub_chunk.strip())
-                    sub_chunk = word
-                else:
-                    sub_chunk += (" " + word) if sub_chunk else word
-            if sub_chunk:
-                chunks.append(sub_chunk.strip())
-        else:
-            if len(current_chunk) + len(sentence) + (1 if current_chunk else 0) > max_chars:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence
-            else:
-                current_chunk += (" " + sentence) if current_chunk else sentence
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    return chunks
-async def generate_realtime_audio(text: str, api_key: str, voice: str = "ara") -> AudioSegment:
+REPEATER_INSTRUCTIONS = "You are a text repeater for TTS. Your only job is to output the exact text from the user message as speech. Do not add, remove, or change any words. Do not introduce, comment, or respond. Repeat verbatim only."
+tts_client = TTSClient(XAI_API_KEY)
+def generate_realtime_audio(text: str, voice: str = "ara") -> AudioSegment:
     if not text or not text.strip():
         return AudioSegment.empty()
-    uri = "wss://api.x.ai/v1/realtime"
-    text_chunks = split_long_text(text)
-    print(f"Split response into {len(text_chunks)} TTS chunks")
-    audio_data = b""
-    retry_count = 0
-    max_retries = 3
-    while retry_count < max_retries:
-        try:
-            async with websockets.connect(uri, additional_headers={"Authorization": f"Bearer {api_key}"}) as websocket:
-                await websocket.recv()
-                session_message = {
-                    "type": "session.update",
-                    "session": {
-                        "instructions": "You are a text repeater for TTS. Your only job is to output the exact text from the user message as speech. Do not add, remove, or change any words. Do not introduce, comment, or respond. Repeat verbatim only.",
-                        "turn_detection": {"type": None},
-                        "audio": {"output": {"format": {"type": "audio/pcm", "rate": 24000}}},
-                        "voice": voice
-                    }
-                }
-                await websocket.send(json.dumps(session_message))
-                while True:
-                    msg = await websocket.recv()
-                    data = json.loads(msg)
-                    if data["type"] == "session.updated":
-                        break
-                for chunk in text_chunks:
-                    text_input = {
-                        "type": "conversation.item.create",
-                        "item": {"type": "message", "role": "user", "content": [{"type": "input_text", "text": chunk}]}
-                    }
-                    await websocket.send(json.dumps(text_input))
-                    await websocket.send(json.dumps({"type": "response.create", "response": {}}))
-                    while True:
-                        msg = await websocket.recv()
-                        data = json.loads(msg)
-                        if data["type"] == "response.output_audio.delta":
-                            audio_data += base64.b64decode(data["delta"])
-                        elif data["type"] == "response.output_audio.done":
-                            break
-                        elif data["type"] == "error":
-                            raise Exception("Audio error")
-                    await asyncio.sleep(0.5)
-                break
-        except Exception as e:
-            retry_count += 1
-            print(f"TTS retry {retry_count}: {e}")
-            await asyncio.sleep(2 ** retry_count)
+    try:
+        chunks = tts_client.synthesize_sync(text, voice, REPEATER_INSTRUCTIONS)
+    except TTSError as e:
+        print(f"TTS failed: {e}")
+        return AudioSegment.empty()
+    print(f"Split response into {len(chunks)} TTS chunks ({tts_client.stats()})")
+    audio_data = b"".join(chunks)
     if not audio_data:
         return AudioSegment.empty()
-    segment = AudioSegment.from_raw(io.BytesIO(audio_data), sample_width=2, frame_rate=24000, channels=1)
-    return segment.normalize()
+    return pcm_to_segment(normalize_pcm(audio_data))
 # --- MAIN LOOP ---
-messages = [{"role": "system", "content": SYSTEM_MSG}]
-porcupine = pvporcupine.create(access_key=PORCUPINE_ACCESS_KEY, keywords=[WAKE_WORD])
-pa = pyaudio.PyAudio()
+memory = ConversationMemory(SYSTEM_MSG, cli.memory_tokens, cli.max_tool_chars, chat_summarizer(lambda: loader.get("chat client")))
+porcupine = loader.load_now("porcupine", lambda: pvporcupine.create(access_key=PORCUPINE_ACCESS_KEY, keywords=[WAKE_WORD]))
+pa = loader.load_now("pyaudio", pyaudio.PyAudio)
 input_stream = pa.open(rate=porcupine.sample_rate, channels=1, format=pyaudio.paInt16, input=True, frames_per_buffer=porcupine.frame_length)
-print(f"Grapefruit Listening in {CURRENT_WDR}")
+output_stream = pa.open(rate=TTS_SAMPLE_RATE, channels=1, format=pyaudio.paInt16, output=True)
+player = PCMPlayer(output_stream)
+speaker = ReplySpeaker(tts_client, player, "ara", REPEATER_INSTRUCTIONS)
+endpointer = Endpointer(make_vad(cli.vad), SAMPLE_RATE, cli.trailing_silence_ms, cli.max_record_seconds)
+if cli.eager:
+    loader.wait_all()
+if cli.profile_startup:
+    loader.report_when_ready()
+print(f"Grapefruit Listening in {CURRENT_WDR} ({time.perf_counter() - STARTUP:.1f}s after start)")
 try:
     while True:
-        pcm = input_stream.read(porcupine.frame_length)
+        if not announcements.empty():
+            subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 1", shell=True)
+            while not announcements.empty():
+                text = announcements.get()
+                print(f"Grok: {text}")
+                speaker.say(text)
+            speaker.finish()
+            time.sleep(1)
+            subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 0", shell=True)
+        pcm = input_stream.read(porcupine.frame_length, exception_on_overflow=False)
+        endpointer.vad.calibrate(pcm)
         if porcupine.process(struct.unpack_from("h" * porcupine.frame_length, pcm)) >= 0:
             print("\n[Wake Word]")
             subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 1", shell=True)
@@ -214,49 +304,60 @@ try:
             subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 0", shell=True)
             time.sleep(0.5)
            
-            # Record
-            frames = []
-            for _ in range(0, int(SAMPLE_RATE / porcupine.frame_length * RECORD_SECONDS)):
-                frames.append(input_stream.read(porcupine.frame_length))
-            with wave.open(get_script_file("temp_query.wav"), "wb") as wf:
-                wf.setnchannels(1)
-                wf.setsampwidth(2)
-                wf.setframerate(SAMPLE_RATE)
-                wf.writeframes(b''.join(frames))
+            # Record until the user stops talking; only the speech is kept
+            # (and, unless --no-partials or the model is still loading, transcribed incrementally while it is being spoken)
+            record_start = time.perf_counter()
+            partials = not cli.no_partials and loader.ready("stt model")
+            if partials:
+                transcriber = StreamingTranscriber(loader.get("stt model"))
+                transcriber.start()
+            speech, reason = endpointer.record(lambda: input_stream.read(porcupine.frame_length, exception_on_overflow=False),
+                                               transcriber.add if partials else None)
+            print(f"Recorded {len(speech) / 2 / SAMPLE_RATE:.1f}s of speech in {time.perf_counter() - record_start:.1f}s ({reason})")
            
-            # STT
-            user_query = whisper_model.transcribe(get_script_file("temp_query.wav"))["text"].strip()
+            # STT straight from memory: the backends take 16 kHz float32 samples, no WAV or ffmpeg decode
+            if not partials:
+                user_query = loader.get("stt model").transcribe(pcm_to_float32(speech)) if speech else ""
+            else:
+                user_query = transcriber.finish(speech)
             if not user_query: continue
             print(f"User: {user_query}")
-            messages.append({"role": "user", "content": user_query})
-            # Agent loop
+            memory.append({"role": "user", "content": user_query})
+            # Agent loop. Replies are streamed: each finished sentence is spoken while the rest is generated
+            subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 1", shell=True)
+            turn_start = time.perf_counter()
+            player.reset()
             while True:
-                response = client.chat.completions.create(model="grok-4-1-fast", messages=messages, tools=tools)
-                msg = response.choices[0].message
-                if not msg.tool_calls:
+                print(f"Prompt: {memory.stats()}")
+                content, tool_calls = stream_chat(loader.get("chat client"), memory.messages, tools, on_text=None if cli.no_stream else speaker.feed)
+                if not tool_calls:
                     break
-                messages.append(msg)
-                for tool in msg.tool_calls:
-                    args = json.loads(tool.function.arguments)
-                    if tool.function.name == "execute_bash":
-                        res = run_bash(args["command"], args.get("run_in_background", False))
-                    elif tool.function.name == "web_search":
-                        res = run_web_search(args["query"])
-                    messages.append({"role": "tool", "tool_call_id": tool.id, "name": tool.function.name, "content": res})
-            final_text = response.choices[0].message.content
+                memory.append({"role": "assistant", "content": content, "tool_calls": tool_calls})
+                for tool, res in zip(tool_calls, run_tool_calls(tool_calls, turn_start + cli.turn_deadline)):
+                    memory.append({"role": "tool", "tool_call_id": tool["id"], "name": tool["function"]["name"], "content": res})
+            final_text = content
             print(f"Grok: {final_text}")
-            messages.append({"role": "assistant", "content": final_text})
-            # TTS with Grok Realtime
-            print("Generating speech...")
-            audio_segment = asyncio.run(generate_realtime_audio(final_text, XAI_API_KEY, voice="ara"))
-            audio_segment.export(get_script_file("temp_res.wav"), format="wav")
-            subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 1", shell=True)
-            subprocess.run(["paplay", get_script_file("temp_res.wav")])
+            memory.append({"role": "assistant", "content": final_text})
+            memory.compact_in_background()
+            if cli.no_stream:
+                # TTS with Grok Realtime
+                print("Generating speech...")
+                audio_segment = generate_realtime_audio(final_text, voice="ara")
+                player.write(audio_segment.raw_data)
+                player.drain()
+            else:
+                speaker.finish()
+                if player.first_audio_at:
+                    print(f"First audio {player.first_audio_at - turn_start:.2f}s after the query ({tts_client.stats()})")
             time.sleep(2)
             subprocess.run("pactl set-source-mute @DEFAULT_SOURCE@ 0", shell=True)
 except KeyboardInterrupt:
     pass
 finally:
+    speaker.close()
+    player.close()
     input_stream.close()
+    output_stream.close()
     pa.terminate()
-    porcupine.delete()
\ No newline at end of file
+    porcupine.delete()
+    tts_client.close()
\ No newline at end of file
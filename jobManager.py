@@ -0,0 +1,179 @@
+import argparse
+import collections
+import logging
+import logging.handlers
+import os
+import re
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+# Tracks background commands started by the assistant. Output goes to a rotating log file per job,
+# heavy jobs (TTS renders, SFX diffusion, big encodes) wait in a FIFO queue so only `max_heavy` of
+# them run at once, and every job can be listed, inspected and cancelled. on_finish is called from
+# the job's watcher thread when it ends, e.g. to announce it by voice. Each command runs under this file
+# as a small detached wrapper that does the log rotation, so jobs keep running (and logging) if the
+# assistant exits.
+
+LOG_DIR = os.getenv("GRAPEFRUIT_JOB_LOGS", os.path.join(os.path.expanduser("~"), ".cache", "grapefruit", "jobs"))
+HEAVY_PATTERNS = [r"\bpodcast\.py\b", r"\bextractAudio\.py\b", r"\baudioDrama\.py\b", r"\bsoundEffects\w*\.py\b",
+                  r"\baudioldm", r"\bffmpeg\b", r"\bwhisper"]
+
+def is_heavy(command: str) -> bool:
+    return any(re.search(pattern, command) for pattern in HEAVY_PATTERNS)
+
+class Job:
+    def __init__(self, job_id: int, command: str, heavy: bool, log_path: str, cwd: str = None):
+        self.id = job_id
+        self.command = command
+        self.cwd = cwd
+        self.heavy = heavy
+        self.log_path = log_path
+        self.status = "queued"
+        self.returncode = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.proc = None
+
+    @property
+    def runtime(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def describe(self) -> str:
+        kind = "heavy " if self.heavy else ""
+        code = f", exit {self.returncode}" if self.returncode is not None else ""
+        return f"job {self.id} [{kind}{self.status}{code}, {self.runtime:.0f}s]: {self.command}"
+
+class JobManager:
+    def __init__(self, log_dir: str = LOG_DIR, max_heavy: int = 1, log_bytes: int = 5 * 1024 * 1024,
+                 log_backups: int = 2, on_finish: Optional[Callable[[Job], None]] = None):
+        self.log_dir = log_dir
+        self.max_heavy = max_heavy
+        self.log_bytes = log_bytes
+        self.log_backups = log_backups
+        self.on_finish = on_finish
+        self.jobs = {}
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._next_id = 1
+        os.makedirs(log_dir, exist_ok=True)
+
+    def start(self, command: str, cwd: str = None) -> Job:
+        with self._lock:
+            job = Job(self._next_id, command, is_heavy(command), os.path.join(self.log_dir, f"job_{self._next_id}.log"), cwd)
+            self._next_id += 1
+            self.jobs[job.id] = job
+            if job.heavy:
+                self._queue.append(job)
+            else:
+                self._launch(job)
+            self._dispatch()
+        return job
+
+    def _running_heavy(self) -> int:
+        return sum(1 for job in self.jobs.values() if job.heavy and job.status == "running")
+
+    # Start queued heavy jobs while there is room; called with the lock held
+    def _dispatch(self):
+        while self._queue and self._running_heavy() < self.max_heavy:
+            self._launch(self._queue.popleft())
+
+    def _launch(self, job: Job):
+        try:
+            wrapper = [sys.executable, os.path.abspath(__file__), "--log", job.log_path, "--max-bytes", str(self.log_bytes),
+                       "--backups", str(self.log_backups), "--", job.command]
+            # The job's output goes through a pipe, so Python jobs would block-buffer it until they exit
+            env = dict(os.environ, PYTHONUNBUFFERED="1")
+            job.proc = subprocess.Popen(wrapper, cwd=job.cwd, env=env, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL, start_new_session=True)
+        except OSError as e:
+            job.status = "failed"
+            job.finished_at = time.time()
+            print(f"Job {job.id} failed to start: {e}")
+            return
+        job.status = "running"
+        job.started_at = time.time()
+        threading.Thread(target=self._follow, args=(job,), name=f"job-{job.id}", daemon=True).start()
+
+    def _follow(self, job: Job):
+        returncode = job.proc.wait()
+        with self._lock:
+            job.returncode = returncode
+            job.finished_at = time.time()
+            if job.status == "running":
+                job.status = "done" if returncode == 0 else "failed"
+            self._dispatch()
+        print(f"Job finished: {job.describe()}")
+        if self.on_finish:
+            self.on_finish(job)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self.jobs.values())
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self.jobs.get(int(job_id))
+
+    def tail(self, job: Job, lines: int = 10) -> str:
+        try:
+            with open(job.log_path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                f.seek(max(0, f.tell() - 8192))
+                return "\n".join(f.read().decode("utf-8", "replace").splitlines()[-lines:])
+        except FileNotFoundError:
+            return ""
+
+    def cancel(self, job_id: int, grace: float = 5.0) -> bool:
+        job = self.get(job_id)
+        if job is None:
+            return False
+        with self._lock:
+            if job.status == "queued":
+                self._queue.remove(job)
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                return True
+            if job.status != "running":
+                return False
+            job.status = "cancelled"
+        # The job runs in its own session, so the whole process group (shell and children) is stopped
+        try:
+            os.killpg(job.proc.pid, signal.SIGTERM)
+            job.proc.wait(timeout=grace)
+        except subprocess.TimeoutExpired:
+            os.killpg(job.proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        return True
+
+# Wrapper process for one job: runs the command and copies its output into a rotating log
+def run_logged(command: str, log_path: str, max_bytes: int, backups: int) -> int:
+    logger = logging.getLogger("grapefruit.job")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=max_bytes, backupCount=backups)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.info(f"$ {command}")
+    proc = subprocess.Popen(command, shell=True, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    for line in iter(proc.stdout.readline, b""):
+        logger.info(line.decode("utf-8", "replace").rstrip("\n"))
+    returncode = proc.wait()
+    logger.info(f"[exit {returncode}]")
+    handler.close()
+    return returncode
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a command with its output in a rotating log (used by JobManager)")
+    parser.add_argument("--log", required=True)
+    parser.add_argument("--max-bytes", type=int, default=5 * 1024 * 1024)
+    parser.add_argument("--backups", type=int, default=2)
+    parser.add_argument("command")
+    args = parser.parse_args()
+    sys.exit(run_logged(args.command, args.log, args.max_bytes, args.backups))
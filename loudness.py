@@ -0,0 +1,86 @@
+import math
+import subprocess
+import numpy as np
+
+SAMPLE_RATE = 24000
+
+# Incremental loudness measurement for s16 PCM. Peak is exact; loudness is BS.1770-style gated block
+# energy (400 ms blocks, -70 dB absolute and -10 dB relative gates) without the K-weighting filter,
+# which is close enough to keep speech-heavy parts consistent. Only one float per block is kept, so
+# hours of audio can be measured while it is being written.
+class LoudnessMeter:
+    def __init__(self, sample_rate: int = SAMPLE_RATE, block_ms: float = 400):
+        self.block = int(sample_rate * block_ms / 1000)
+        self.peak = 0
+        self.samples = 0
+        self._energies = []
+        self._pending = np.zeros(0, dtype=np.float64)
+
+    def update(self, pcm: bytes):
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16)
+        if not len(samples):
+            return
+        self.samples += len(samples)
+        self.peak = max(self.peak, int(np.abs(samples.astype(np.int32)).max()))
+        data = np.concatenate([self._pending, samples.astype(np.float64) / 32768.0])
+        full = len(data) // self.block * self.block
+        if full:
+            self._energies.extend(np.mean(data[:full].reshape(-1, self.block) ** 2, axis=1))
+        self._pending = data[full:]
+
+    @property
+    def peak_dbfs(self) -> float:
+        return 20 * math.log10(self.peak / 32768.0) if self.peak else -math.inf
+
+    @property
+    def loudness_db(self) -> float:
+        energies = np.array(self._energies + ([np.mean(self._pending ** 2)] if len(self._pending) else []))
+        energies = energies[energies > 10 ** (-70 / 10)]
+        if not len(energies):
+            return -math.inf
+        relative_gate = np.mean(energies) * 10 ** (-10 / 10)
+        gated = energies[energies > relative_gate]
+        return 10 * math.log10(np.mean(gated))
+
+    # Same target as pydub.effects.normalize(headroom=0.1)
+    def gain_to_peak(self, headroom_db: float = 0.1) -> float:
+        return -headroom_db - self.peak_dbfs if self.peak else 0.0
+
+    # Gain to reach a loudness target, capped so the peak never clips
+    def gain_to_loudness(self, target_db: float = -16.0, headroom_db: float = 1.0) -> float:
+        if not self.peak:
+            return 0.0
+        return min(target_db - self.loudness_db, self.gain_to_peak(headroom_db))
+
+# Passes frames through to another sink while measuring them
+class MeteredSink:
+    def __init__(self, sink, meter: LoudnessMeter):
+        self.sink = sink
+        self.meter = meter
+
+    def write(self, pcm: bytes):
+        self.meter.update(pcm)
+        self.sink.write(pcm)
+
+    def close(self):
+        self.sink.close()
+
+# Second pass: stream the measured file through ffmpeg with a fixed gain, encoding to the output format
+def apply_gain(src_path: str, dst_path: str, gain_db: float):
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-i", src_path, "-af", f"volume={gain_db:.2f}dB", dst_path], check=True)
+
+# Single-pass EBU R128 normalization with ffmpeg's loudnorm filter (true LUFS, K-weighted)
+def loudnorm(src_path: str, dst_path: str, target_lufs: float = -16.0, extra_args=None):
+    cmd = ["ffmpeg", "-y", "-loglevel", "error"] + list(extra_args or []) + ["-i", src_path]
+    cmd += ["-af", f"loudnorm=I={target_lufs}:TP=-1.5:LRA=11", "-ar", str(SAMPLE_RATE), dst_path]
+    subprocess.run(cmd, check=True)
+
+# Peak-normalize a short in-memory clip (e.g. one spoken reply)
+def normalize_pcm(pcm: bytes, headroom_db: float = 0.1) -> bytes:
+    meter = LoudnessMeter()
+    meter.update(pcm)
+    if not meter.peak:
+        return pcm
+    gain = 10 ** (meter.gain_to_peak(headroom_db) / 20)
+    samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16).astype(np.float32) * gain
+    return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
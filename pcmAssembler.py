@@ -0,0 +1,135 @@
+import numpy as np
+from pydub import AudioSegment
+
+SAMPLE_RATE = 24000
+
+# Builds one long mono s16 PCM stream in a preallocated numpy buffer that grows by doubling.
+# Chunks, silence gaps and crossfades are written in place, so each append only costs the size
+# of the new chunk; `full_audio += seg` with pydub copies everything assembled so far every time.
+# Given a sink (see audioSink.py), everything but the last `hold_ms` (kept for crossfades) is
+# flushed to it every `flush_seconds`, so memory stays constant however long the output gets.
+# Overlays (ambience beds under dialogue) are summed in only when their stretch is flushed or read,
+# once per sample, so a bed never costs a copy of the whole track the way a pydub overlay does.
+class PCMAssembler:
+    def __init__(self, sample_rate: int = SAMPLE_RATE, reserve_seconds: float = 60.0, sink=None,
+                 hold_ms: float = 1000, flush_seconds: float = 10.0):
+        self.sample_rate = sample_rate
+        self.sink = sink
+        self._hold = self._ms_to_samples(hold_ms)
+        self._flush_at = int(sample_rate * flush_seconds)
+        if sink is not None:
+            reserve_seconds = min(reserve_seconds, 2 * flush_seconds)
+        self._data = np.zeros(int(sample_rate * reserve_seconds), dtype=np.int16)
+        self._len = 0
+        self._flushed = 0
+        self._overlays = []  # (absolute start sample, float32 samples)
+
+    def _ms_to_samples(self, ms: float) -> int:
+        return int(self.sample_rate * ms / 1000)
+
+    def _flush(self, keep: int):
+        count = self._len - keep
+        if self.sink is None or count <= 0:
+            return
+        self.sink.write(self._mix(self._flushed, self._data[:count]).tobytes())
+        self._data[:keep] = self._data[count:self._len]
+        self._len = keep
+        self._flushed += count
+        self._overlays = [(start, samples) for start, samples in self._overlays if start + len(samples) > self._flushed]
+
+    # Sum every overlay that intersects [start, start + len(samples)) into a copy of samples
+    def _mix(self, start: int, samples: np.ndarray) -> np.ndarray:
+        end = start + len(samples)
+        active = [(s, o) for s, o in self._overlays if s < end and s + len(o) > start]
+        if not active:
+            return samples
+        mixed = samples.astype(np.float32)
+        for s, o in active:
+            a, b = max(s, start), min(s + len(o), end)
+            mixed[a - start:b - start] += o[a - s:b - s]
+        return np.clip(mixed, -32768, 32767).astype(np.int16)
+
+    # Pad with silence so overlays that outlast the main track are not cut off
+    def _extend_to_overlays(self):
+        end = max((start + len(samples) for start, samples in self._overlays), default=0)
+        missing = end - (self._flushed + self._len)
+        if missing > 0:
+            self._reserve(missing)
+            self._data[self._len:self._len + missing] = 0
+            self._len += missing
+
+    def _maybe_flush(self):
+        if self._len - self._hold >= self._flush_at:
+            self._flush(self._hold)
+
+    def _reserve(self, extra: int):
+        needed = self._len + extra
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=np.int16)
+            grown[:self._len] = self._data[:self._len]
+            self._data = grown
+
+    def add(self, pcm: bytes, crossfade_ms: float = 0):
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16)
+        overlap = min(self._ms_to_samples(crossfade_ms), self._len, len(samples))
+        if overlap:
+            tail = self._data[self._len - overlap:self._len].astype(np.float32)
+            ramp = np.linspace(0.0, 1.0, overlap, dtype=np.float32)
+            mixed = tail * (1.0 - ramp) + samples[:overlap].astype(np.float32) * ramp
+            self._data[self._len - overlap:self._len] = np.clip(mixed, -32768, 32767).astype(np.int16)
+            samples = samples[overlap:]
+        self._reserve(len(samples))
+        self._data[self._len:self._len + len(samples)] = samples
+        self._len += len(samples)
+        self._maybe_flush()
+
+    def add_silence(self, ms: float):
+        count = self._ms_to_samples(ms)
+        self._reserve(count)
+        self._data[self._len:self._len + count] = 0
+        self._len += count
+        self._maybe_flush()
+
+    def add_segment(self, segment: AudioSegment, crossfade_ms: float = 0):
+        segment = segment.set_frame_rate(self.sample_rate).set_channels(1).set_sample_width(2)
+        self.add(segment.raw_data, crossfade_ms)
+
+    # Schedule audio to play under whatever is written from the current end onwards, with short fades
+    def overlay(self, pcm: bytes, gain_db: float = 0.0, fade_ms: float = 50):
+        samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16).astype(np.float32) * 10 ** (gain_db / 20)
+        fade = min(self._ms_to_samples(fade_ms), len(samples) // 2)
+        if fade:
+            ramp = np.linspace(0.0, 1.0, fade, dtype=np.float32)
+            samples[:fade] *= ramp
+            samples[len(samples) - fade:] *= ramp[::-1]
+        if len(samples):
+            self._overlays.append((self._flushed + self._len, samples))
+
+    def overlay_segment(self, segment: AudioSegment, gain_db: float = 0.0, fade_ms: float = 50):
+        segment = segment.set_frame_rate(self.sample_rate).set_channels(1).set_sample_width(2)
+        self.overlay(segment.raw_data, gain_db, fade_ms)
+
+    # Length of the main track written so far (an overlay running past it extends the output on close)
+    @property
+    def duration_ms(self) -> float:
+        return 1000 * (self._flushed + self._len) / self.sample_rate
+
+    def pcm(self) -> bytes:
+        if self._flushed:
+            raise RuntimeError("Audio already streamed to the sink; only the unflushed tail is in memory")
+        self._extend_to_overlays()
+        return self._mix(0, self._data[:self._len]).tobytes()
+
+    # Flush the remaining tail and close the sink
+    def close(self):
+        if self.sink is not None:
+            self._extend_to_overlays()
+            self._flush(0)
+            self.sink.close()
+
+    # The only point where a pydub AudioSegment (and a full copy of the audio) is created
+    def to_segment(self) -> AudioSegment:
+        return AudioSegment(data=self.pcm(), sample_width=2, frame_rate=self.sample_rate, channels=1)
+
+    def export(self, path: str, format: str = "wav"):
+        self.to_segment().export(path, format=format).close()
@@ -1,19 +1,24 @@
 import argparse
 import json
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from pypdf import PdfReader
 from pydantic import BaseModel
 from typing import List, Literal
-import io
 from pydub import AudioSegment
 import os
 import subprocess
 import re
 import asyncio
-import websockets
-import base64
-import time  # For delays
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from buildDir import BuildDir, fingerprint
+from realtimeTTS import TTSClient, TTSError, VERBATIM_INSTRUCTIONS
+from pcmAssembler import PCMAssembler
+from audioSink import open_sink
+from loudness import loudnorm
+from ttsCache import TTSCache
 
 # Pydantic models for structured script output
 def verbalize_math(text: str) -> str:
@@ -82,7 +87,7 @@ def extract_sections(input_path: str):
     return sections, full_text
 
 # Step 2: Generate podcast script segment using xAI Grok API
-def generate_script_segment(content: str, xai_api_key: str, segment_type: str = "discussion", prev_summary: str = "", next_title: str = "") -> Script:
+def generate_script_segment(content: str, xai_api_key: str, segment_type: str = "discussion", prev_summary: str = "", next_title: str = "", http: requests.Session = None) -> Script:
     url = "https://api.x.ai/v1/chat/completions"
     base_prompt = """
 You are a podcast producer creating a long, detailed discussion segment.
@@ -137,7 +142,7 @@ Hosts: Rachel (female, enthusiastic expert) and Roger (male, analytical co-host)
     headers = {"Authorization": f"Bearer {xai_api_key}"}
     
     try:
-        response = requests.post(url, json=payload, headers=headers)
+        response = (http or requests).post(url, json=payload, headers=headers)
         response.raise_for_status()
     except requests.exceptions.HTTPError as e:
         print(f"API error: {e}\nResponse: {response.text if 'response' in locals() else ''}")
@@ -146,167 +151,146 @@ Hosts: Rachel (female, enthusiastic expert) and Roger (male, analytical co-host)
     content = json.loads(response.json()["choices"][0]["message"]["content"])
     return Script(**content)
 
-# Helper to split long text into chunks at sentence boundaries, and further split long sentences at word boundaries
-def split_long_text(text: str, max_chars: int = 4000):  # Increased for Grok
-    if not text.strip():
-        return []
-    
-    # Split into sentences using lookbehind for punctuation followed by space
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    
-    # Filter out empty sentences
-    sentences = [s.strip() for s in sentences if s.strip()]
-    
-    chunks = []
-    current_chunk = ""
-    
-    for sentence in sentences:
-        # If the sentence itself is longer than max_chars, split it into word-based subchunks
-        if len(sentence) > max_chars:
-            words = sentence.split()
-            sub_chunk = ""
-            for word in words:
-                if len(sub_chunk) + len(word) + (1 if sub_chunk else 0) > max_chars:
-                    if sub_chunk:
-                        chunks.append(sub_chunk.strip())
-                    sub_chunk = word
-                else:
-                    sub_chunk += (" " + word) if sub_chunk else word
-            if sub_chunk:
-                chunks.append(sub_chunk.strip())
-        else:
-            # Otherwise, add to current_chunk as before
-            if len(current_chunk) + len(sentence) + (1 if current_chunk else 0) > max_chars:
-                if current_chunk:
-                    chunks.append(current_chunk.strip())
-                current_chunk = sentence
-            else:
-                current_chunk += (" " + sentence) if current_chunk else sentence
-    
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-    
-    return chunks
+# Describe every segment up front, in playback order. The prev_summary/next_title chaining only
+# depends on section titles, so no segment has to wait for another one's script.
+def plan_segments(sections, full_text: str):
+    jobs = [dict(content=full_text, segment_type="intro")]
+    jobs.append(dict(content=full_text, segment_type="primer", prev_summary="The introduction to the topic.",
+                     next_title=sections[0]['title'] if sections else ""))
+    prev_summary = "The background explanation of key terms, concepts, and mathematics."
+    for i, sec in enumerate(sections):
+        next_title = sections[i+1]['title'] if i+1 < len(sections) else ""
+        jobs.append(dict(content=sec['text'], prev_summary=prev_summary, next_title=next_title))
+        prev_summary = f"Discussion of {sec['title']}: Key points included [briefly summarize in prompt if needed, but keep simple]."
+    outro_summary = " ".join([f"{sec['title']}: [discussed in detail]." for sec in sections])
+    jobs.append(dict(content=outro_summary, segment_type="outro"))
+    return jobs
 
-# Helper function to generate audio from a single script segment using Grok Voice API
-async def script_to_audio_async(script: Script, api_key: str) -> AudioSegment:
-    uri = "wss://api.x.ai/v1/realtime"
-    audio_segments = []
-    pause = AudioSegment.silent(duration=250)
-    
-    for line in script.script:
-        voice = "ara" if line.speaker == "Rachel" else "Rex"
-        
-        text_chunks = split_long_text(line.text)
-        print(f"Split {len(line.text)} chars into {len(text_chunks)} chunks for {line.speaker} ({voice})")
-        
-        line_wav_segments = []
-        retry_count = 0
-        max_retries = 3
-        
-        while retry_count < max_retries:
+# One keep-alive HTTP session shared by all script requests, with a connection per worker
+def make_http_session(concurrency: int) -> requests.Session:
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=concurrency)
+    http.mount("https://", adapter)
+    return http
+
+# Grok voice that reads a speaker's lines
+def line_voice(line: LineItem) -> str:
+    return "ara" if line.speaker == "Rachel" else "Rex"
+
+# Lines are grouped by voice and each voice works through all of its lines back to back on one
+# long-lived session (the pool hands the same warm session to every request of a voice), with both
+# voices synthesizing at the same time. Audio is written out in dialogue order as lines resolve.
+async def render_script(script: Script, tts: TTSClient, out: PCMAssembler):
+    loop = asyncio.get_running_loop()
+    lines = script.script
+    results = [loop.create_future() for _ in lines]
+    by_voice = {}
+    for index, line in enumerate(lines):
+        by_voice.setdefault(line_voice(line), []).append(index)
+
+    async def speak_lines(voice, indices):
+        for position, index in enumerate(indices):
             try:
-                async with websockets.connect(uri, additional_headers={"Authorization": f"Bearer {api_key}"}) as websocket:
-                    await websocket.recv()
-                    
-                    session_message = {
-                        "type": "session.update",
-                        "session": {
-                            "instructions": (
-                                "You are a verbatim TTS reader. Output ONLY the exact input text as speech. No paraphrase, improv, summary, explanation, or changes. Word-for-word exact read. "
-                                "without adding, removing, changing, or commenting on any content. Do not add introductions, "
-                                "summaries, explanations, or any extra words whatsoever. Output only the spoken audio of the text."
-                            ),
-                            "turn_detection": {"type": None},
-                            "audio": {
-                                "output": {
-                                    "format": {"type": "audio/pcm", "rate": 24000}
-                                }
-                            },
-                            "voice": voice
-                        }
-                    }
-                    await websocket.send(json.dumps(session_message))
-                    
-                    while True:
-                        msg = await websocket.recv()
-                        data = json.loads(msg)
-                        if data["type"] == "session.updated":
-                            break
-                        elif data["type"] == "error":
-                            print("Error updating session:", data)
-                            raise Exception("Session update error")
-                    
-                    for chunk in text_chunks:
-                        text_input = {
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "message",
-                                "role": "user",
-                                "content": [{"type": "input_text", "text": chunk}]
-                            }
-                        }
-                        await websocket.send(json.dumps(text_input))
-                        
-                        generate_message = {"type": "response.create", "response": {}}
-                        await websocket.send(json.dumps(generate_message))
-                        
-                        audio_data = b""
-                        while True:
-                            msg = await websocket.recv()
-                            data = json.loads(msg)
-                            if data["type"] == "response.output_audio.delta":
-                                audio_data += base64.b64decode(data["delta"])
-                            elif data["type"] == "response.output_audio.done":
-                                break
-                            elif data["type"] == "error":
-                                print("Error:", data)
-                                raise Exception("Audio generation error")
-                        
-                        if audio_data:
-                            segment = AudioSegment.from_raw(
-                                io.BytesIO(audio_data),
-                                sample_width=2,
-                                frame_rate=24000,
-                                channels=1
-                            )
-                            line_wav_segments.append(segment)
-                        
-                        await asyncio.sleep(0.5)
-                    
-                    break  # Success, exit retry loop
-            
+                chunks = await tts.synthesize(lines[index].text, voice, VERBATIM_INSTRUCTIONS, max_chars=4000)  # Increased for Grok
+            except TTSError as e:
+                chunks = e
             except Exception as e:
-                retry_count += 1
-                print(f"Connection error for line: {e}. Retrying {retry_count}/{max_retries}...")
-                await asyncio.sleep(2 ** retry_count)
-        
-        if retry_count >= max_retries:
-            print("Max retries exceeded for this line. Skipping.")
-            continue
-        
-        if line_wav_segments:
-            full_line_segment = line_wav_segments[0]
-            for seg in line_wav_segments[1:]:
-                full_line_segment = full_line_segment.append(seg, crossfade=50)
-            audio_segments.append(full_line_segment)
-            audio_segments.append(pause)
-    
-    if audio_segments:
-        audio_segments.pop()
-    
-    full_segment_audio = sum(audio_segments) if audio_segments else AudioSegment.empty()
-    
-    return full_segment_audio
+                for rest in indices[position:]:
+                    results[rest].set_exception(e)
+                return
+            results[index].set_result(chunks)
 
-def script_to_audio(script: Script, api_key: str) -> AudioSegment:
-    return asyncio.run(script_to_audio_async(script, api_key))
+    workers = [asyncio.ensure_future(speak_lines(voice, indices)) for voice, indices in by_voice.items()]
+    try:
+        first_line = True
+        for line, result in zip(lines, results):
+            chunks = await result
+            if isinstance(chunks, TTSError):
+                print(f"{chunks} Skipping line.")
+                continue
+            print(f"Split {len(line.text)} chars into {len(chunks)} chunks for {line.speaker} ({line_voice(line)})")
+            
+            chunks = [pcm for pcm in chunks if pcm]
+            if chunks:
+                if not first_line:
+                    out.add_silence(250)
+                first_line = False
+                out.add(chunks[0])
+                for pcm in chunks[1:]:
+                    out.add(pcm, crossfade_ms=50)
+    finally:
+        for worker in workers:
+            worker.cancel()
+
+async def script_to_audio_async(script: Script, tts: TTSClient) -> AudioSegment:
+    out = PCMAssembler()
+    await render_script(script, tts, out)
+    return out.to_segment()
+
+def script_to_audio(script: Script, tts: TTSClient) -> AudioSegment:
+    return asyncio.run(script_to_audio_async(script, tts))
+
+# Producer/consumer pipeline: the LLM produces scripts on a thread pool, and each part starts TTS as soon
+# as its own script arrives. Finished parts go straight to disk, so at most `part_concurrency` parts are in memory.
+# With a BuildDir, each script and part is checkpointed as it completes and finished ones are skipped on resume.
+async def build_parts(jobs, xai_api_key: str, tts: TTSClient, jingle: AudioSegment, out_format: str,
+                      script_concurrency: int = 8, part_concurrency: int = 2, build: BuildDir = None):
+    loop = asyncio.get_running_loop()
+    part_slots = asyncio.Semaphore(part_concurrency)
+    part_names = [f"part_{index}.{out_format}" for index in range(len(jobs))]
+    temp_files = [build.file(name) if build else f"temp_{name}" for name in part_names]
+    http = make_http_session(script_concurrency)
+
+    async def get_script(index, executor) -> Script:
+        name = f"script_{index}.json"
+        if build and build.is_done(name):
+            return Script(**build.load_json(name))
+        script = await loop.run_in_executor(executor, partial(generate_script_segment, xai_api_key=xai_api_key, http=http, **jobs[index]))
+        if build:
+            build.save_json(name, script.model_dump())
+        return script
+
+    async def render_part(index, executor):
+        if build and build.is_done(part_names[index]):
+            print(f"Part {index+1}/{len(jobs)} already built, skipping")
+            return
+        script = await get_script(index, executor)
+        async with part_slots:
+            print(f"Script {index+1}/{len(jobs)} ready, rendering audio")
+            # Stream the part straight into its encoder instead of exporting a finished AudioSegment
+            part_audio = PCMAssembler(sink=open_sink(temp_files[index], format=out_format))
+            try:
+                part_audio.add_segment(jingle)
+                await render_script(script, tts, part_audio)
+            finally:
+                await loop.run_in_executor(None, part_audio.close)
+        if build:
+            build.mark_done(part_names[index])
+        print(f"Part {index+1}/{len(jobs)} written to {temp_files[index]}")
+
+    # Keep going when one part fails so every other part still gets checkpointed
+    with ThreadPoolExecutor(max_workers=script_concurrency) as executor:
+        results = await asyncio.gather(*(render_part(index, executor) for index in range(len(jobs))), return_exceptions=True)
+    http.close()
+    failed = []
+    for index, result in enumerate(results):
+        if isinstance(result, BaseException):
+            print(f"Part {index+1}/{len(jobs)} failed: {result!r}")
+            failed.append(index + 1)
+    return temp_files, failed
 
 # Main CLI entrypoint
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate long, section-by-section podcast from PDF or TXT using Grok API and Grok Voice API")
     parser.add_argument("--input", required=True, help="Path to input file (PDF or TXT)")
     parser.add_argument("--output", default="podcast.mp3", help="Output audio file")
+    parser.add_argument("--script-concurrency", type=int, default=8, help="Max script segment requests in flight at once")
+    parser.add_argument("--part-concurrency", type=int, default=2, help="Max parts being synthesized at once")
+    parser.add_argument("--no-cache", action="store_true", help="Skip the on-disk TTS audio cache")
+    parser.add_argument("--normalize", action="store_true", help="Loudness-normalize the joined podcast (ffmpeg loudnorm)")
+    parser.add_argument("--target-lufs", type=float, default=-16.0, help="Loudness target for --normalize")
+    parser.add_argument("--build-dir", help="Keep generated scripts, rendered parts and a manifest in this directory")
+    parser.add_argument("--resume", action="store_true", help="Skip segments already completed in --build-dir")
     args = parser.parse_args()
     
     xai_key = os.getenv("GROK_API_KEY")
@@ -316,67 +300,49 @@ if __name__ == "__main__":
     sections, full_text = extract_sections(args.input)
     print(f"Detected {len(sections)} sections")
     
-    # Generate intro
-    intro_script = generate_script_segment(full_text, xai_key, segment_type="intro")
-    
-    # Generate primer (background/key concepts)
-    prev_summary = "The introduction to the topic."
-    primer_script = generate_script_segment(full_text, xai_key, segment_type="primer", prev_summary=prev_summary, next_title=sections[0]['title'] if sections else "")
-    
-    # Generate discussion segments iteratively
-    prev_summary = "The background explanation of key terms, concepts, and mathematics."
-    discussion_scripts = []
-    for i, sec in enumerate(sections):
-        next_title = sections[i+1]['title'] if i+1 < len(sections) else ""
-        seg_script = generate_script_segment(sec['text'], xai_key, prev_summary=prev_summary, next_title=next_title)
-        discussion_scripts.append(seg_script)
-        prev_summary = f"Discussion of {sec['title']}: Key points included [briefly summarize in prompt if needed, but keep simple]."
-    
-    # Generate outro
-    outro_summary = " ".join([f"{sec['title']}: [discussed in detail]." for sec in sections])
-    outro_script = generate_script_segment(outro_summary, xai_key, segment_type="outro")
-    
+    # One pooled TTS client keeps the voice sessions warm across every part
+    tts = TTSClient(xai_key, max_sessions_per_key=args.part_concurrency, cache=None if args.no_cache else TTSCache())
+
     # Load jingle
     jingle = AudioSegment.from_wav("jingle.wav")
 
     # Determine output format
     out_format = "wav" if args.output.endswith(".wav") else "mp3"
 
-    # Build list of temp files
-    temp_files = []
-    index = 0
-
-    # Function to add part
-    def add_part(script):
-        global index
-        part_audio = jingle + script_to_audio(script, xai_key)
-        temp_path = f"temp_part_{index}.{out_format}"
-        part_audio.export(temp_path, format=out_format)
-        temp_files.append(temp_path)
-        index += 1
+    # Generate scripts and render parts as one pipeline
+    jobs = plan_segments(sections, full_text)
+    print(f"Generating {len(jobs)} segments: {args.script_concurrency} scripts and {args.part_concurrency} parts at a time")
+    build = None
+    if args.build_dir:
+        build = BuildDir(args.build_dir, fingerprint(full_text, out_format), resume=args.resume)
+    temp_files, failed = asyncio.run(build_parts(jobs, xai_key, tts, jingle, out_format, args.script_concurrency, args.part_concurrency, build))
+    tts.close()
+    print(f"TTS sessions: {tts.stats()}")
 
-    # Add parts
-    add_part(intro_script)
-    add_part(primer_script)
-    for disc_script in discussion_scripts:
-        add_part(disc_script)
-    add_part(outro_script)
+    # Only concatenate once every part is present
+    missing = [tf for tf in temp_files if not os.path.exists(tf)]
+    if failed or missing:
+        hint = " Re-run with --resume to finish the remaining parts." if build else ""
+        raise SystemExit(f"Parts {failed} did not finish; not writing {args.output}.{hint}")
 
     # Create concat list file
-    concat_list = "concat_list.txt"
+    concat_list = build.file("concat_list.txt") if build else "concat_list.txt"
     with open(concat_list, "w") as f:
         for tf in temp_files:
-            f.write(f"file '{tf}'\n")
+            f.write(f"file '{os.path.abspath(tf)}'\n")
 
-    # Use ffmpeg to concatenate
-    subprocess.run([
-        "ffmpeg", "-f", "concat", "-safe", "0", "-i", concat_list, "-c", "copy", args.output
-    ], check=True)
+    # Use ffmpeg to concatenate; with --normalize the same pass runs loudnorm so every part ends up equally loud
+    if args.normalize:
+        loudnorm(concat_list, args.output, args.target_lufs, extra_args=["-f", "concat", "-safe", "0"])
+    else:
+        subprocess.run([
+            "ffmpeg", "-f", "concat", "-safe", "0", "-i", concat_list, "-c", "copy", args.output
+        ], check=True)
 
-    # Clean up
-    for tf in temp_files:
-        os.remove(tf)
-    os.remove(concat_list)
+    # Clean up; a build directory is kept so its parts can be reused
+    if not build:
+        for tf in temp_files:
+            os.remove(tf)
+        os.remove(concat_list)
 
-    # TODO: Add normalization if needed
     print(f"Podcast generated: {args.output}")
\ No newline at end of file
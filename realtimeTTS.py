@@ -0,0 +1,277 @@
+import asyncio
+import base64
+import io
+import json
+import os
+import random
+import re
+import threading
+from contextlib import asynccontextmanager
+from typing import Callable, List, Optional
+import websockets
+from pydub import AudioSegment
+from ttsCache import TTSCache
+
+# Point GROK_REALTIME_URI at fakeRealtimeServer.py (e.g. ws://localhost:8765) to run without the real API
+REALTIME_URI = os.getenv("GROK_REALTIME_URI", "wss://api.x.ai/v1/realtime")
+SAMPLE_RATE = 24000
+
+VERBATIM_INSTRUCTIONS = (
+    "You are a verbatim TTS reader. Output ONLY the exact input text as speech. No paraphrase, improv, summary, explanation, or changes. Word-for-word exact read. "
+    "without adding, removing, changing, or commenting on any content. Do not add introductions, "
+    "summaries, explanations, or any extra words whatsoever. Output only the spoken audio of the text."
+)
+
+class TTSError(Exception):
+    pass
+
+# Helper to split long text into chunks at sentence boundaries, and further split long sentences at word boundaries
+def split_long_text(text: str, max_chars: int = 1000):
+    if not text.strip():
+        return []
+    sentences = re.split(r'(?<=[.!?])\s+', text)
+    sentences = [s.strip() for s in sentences if s.strip()]
+    chunks = []
+    current_chunk = ""
+    for sentence in sentences:
+        if len(sentence) > max_chars:
+            words = sentence.split()
+            sub_chunk = ""
+            for word in words:
+                if len(sub_chunk) + len(word) + (1 if sub_chunk else 0) > max_chars:
+                    if sub_chunk:
+                        chunks.append(sub_chunk.strip())
+                    sub_chunk = word
+                else:
+                    sub_chunk += (" " + word) if sub_chunk else word
+            if sub_chunk:
+                chunks.append(sub_chunk.strip())
+        else:
+            if len(current_chunk) + len(sentence) + (1 if current_chunk else 0) > max_chars:
+                if current_chunk:
+                    chunks.append(current_chunk.strip())
+                current_chunk = sentence
+            else:
+                current_chunk += (" " + sentence) if current_chunk else sentence
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return chunks
+
+def pcm_to_segment(pcm: bytes) -> AudioSegment:
+    if not pcm:
+        return AudioSegment.empty()
+    return AudioSegment.from_raw(io.BytesIO(pcm), sample_width=2, frame_rate=SAMPLE_RATE, channels=1)
+
+# One websocket with the session.update handshake already done for a (voice, instructions) pair
+class RealtimeSession:
+    def __init__(self, uri: str, api_key: str, voice: str, instructions: str):
+        self.uri = uri
+        self.api_key = api_key
+        self.voice = voice
+        self.instructions = instructions
+        self.websocket = None
+        self.closed = True
+        self.responses = 0
+
+    async def open(self):
+        self.websocket = await websockets.connect(self.uri, additional_headers={"Authorization": f"Bearer {self.api_key}"})
+        self.closed = False
+        await self.websocket.recv()
+        session_message = {
+            "type": "session.update",
+            "session": {
+                "instructions": self.instructions,
+                "turn_detection": {"type": None},
+                "audio": {"output": {"format": {"type": "audio/pcm", "rate": SAMPLE_RATE}}},
+                "voice": self.voice
+            }
+        }
+        await self.websocket.send(json.dumps(session_message))
+        while True:
+            data = json.loads(await self.websocket.recv())
+            if data["type"] == "session.updated":
+                break
+            elif data["type"] == "error":
+                print("Error updating session:", data)
+                raise TTSError("Session update error")
+
+    async def speak(self, text: str, on_delta: Optional[Callable[[bytes], None]] = None) -> bytes:
+        text_input = {
+            "type": "conversation.item.create",
+            "item": {"type": "message", "role": "user", "content": [{"type": "input_text", "text": text}]}
+        }
+        await self.websocket.send(json.dumps(text_input))
+        await self.websocket.send(json.dumps({"type": "response.create", "response": {}}))
+        self.responses += 1
+        audio_data = bytearray()
+        item_ids = set()  # This request's input item and the response's output items
+        while True:
+            data = json.loads(await self.websocket.recv())
+            if data["type"] in ("conversation.item.created", "response.output_item.added"):
+                item_ids.add(data["item"]["id"])
+            elif data["type"] == "response.output_audio.delta":
+                delta = base64.b64decode(data["delta"])
+                audio_data += delta
+                if on_delta:
+                    on_delta(delta)
+            elif data["type"] == "response.output_audio.done":
+                break
+            elif data["type"] == "error":
+                print("Error:", data)
+                raise TTSError("Audio generation error")
+        # Let the response finish before the session is lent out again; replaces the old fixed 0.5s sleep
+        try:
+            done = await asyncio.wait_for(self._wait_for("response.done", item_ids), timeout=0.5)
+            item_ids.update(item["id"] for item in done.get("response", {}).get("output", []) if "id" in item)
+        except asyncio.TimeoutError:
+            pass
+        # Drop this exchange from the server-side conversation, so a pooled session reading hundreds of
+        # lines does not carry (and pay for) every earlier line as context
+        for item_id in item_ids:
+            await self.websocket.send(json.dumps({"type": "conversation.item.delete", "item_id": item_id}))
+        return bytes(audio_data)
+
+    async def _wait_for(self, event_type: str, item_ids: set = None):
+        while True:
+            data = json.loads(await self.websocket.recv())
+            if data["type"] == event_type:
+                return data
+            if item_ids is not None and data["type"] in ("conversation.item.created", "response.output_item.added"):
+                item_ids.add(data["item"]["id"])
+
+    async def close(self):
+        self.closed = True
+        if self.websocket is not None:
+            try:
+                await self.websocket.close()
+            except Exception:
+                pass
+
+# Warm sessions keyed by (voice, instructions), lent out one request at a time
+class SessionPool:
+    def __init__(self, api_key: str, uri: str = REALTIME_URI, max_sessions_per_key: int = 4,
+                 max_responses_per_session: int = 200):
+        self.api_key = api_key
+        self.uri = uri
+        self.max_sessions_per_key = max_sessions_per_key
+        self.max_responses_per_session = max_responses_per_session
+        self._idle = {}
+        self._limits = {}
+        self.connects = 0
+        self.reuses = 0
+
+    @asynccontextmanager
+    async def session(self, voice: str, instructions: str):
+        key = (voice, instructions)
+        limit = self._limits.setdefault(key, asyncio.Semaphore(self.max_sessions_per_key))
+        async with limit:
+            idle = self._idle.setdefault(key, [])
+            session = None
+            while idle and session is None:
+                candidate = idle.pop()
+                if not candidate.closed:
+                    session = candidate
+            if session is None:
+                session = RealtimeSession(self.uri, self.api_key, voice, instructions)
+                self.connects += 1
+                try:
+                    await session.open()
+                except BaseException:
+                    await session.close()
+                    raise
+            else:
+                self.reuses += 1
+            healthy = False
+            try:
+                yield session
+                healthy = True
+            finally:
+                # A session that errored mid-response may have stray events queued, so never reuse it.
+                # Sessions are also retired after a number of responses, in case item deletes were missed.
+                if healthy and not session.closed and session.responses < self.max_responses_per_session:
+                    idle.append(session)
+                else:
+                    await session.close()
+
+    async def close(self):
+        for idle in self._idle.values():
+            for session in idle:
+                await session.close()
+        self._idle.clear()
+
+# Shared TTS client: owns a background event loop so the pool stays warm across
+# asyncio.run calls, threads and synchronous scripts alike
+class TTSClient:
+    def __init__(self, api_key: str, uri: str = REALTIME_URI, max_sessions_per_key: int = 4, max_retries: int = 3,
+                 timeout: Optional[float] = None, cache: Optional[TTSCache] = None):
+        self.pool = SessionPool(api_key, uri, max_sessions_per_key)
+        self.cache = cache
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="tts-client", daemon=True)
+        self._thread.start()
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def _synthesize_chunk(self, text: str, voice: str, instructions: str, on_delta=None) -> bytes:
+        if self.cache is not None:
+            pcm = self.cache.get(text, voice, instructions, SAMPLE_RATE)
+            if pcm is not None:
+                if on_delta:
+                    on_delta(pcm)
+                return pcm
+        # A retry regenerates the chunk from the start, so bytes the listener already got are not forwarded again
+        delivered = 0
+        for attempt in range(1, self.max_retries + 1):
+            received = 0
+            def forward(delta: bytes):
+                nonlocal delivered, received
+                skip = max(0, delivered - received)
+                received += len(delta)
+                if skip < len(delta):
+                    on_delta(delta[skip:])
+                    delivered = received
+            try:
+                async with self.pool.session(voice, instructions) as session:
+                    pcm = await asyncio.wait_for(session.speak(text, forward if on_delta else None), self.timeout)
+                if self.cache is not None:
+                    self.cache.put(text, voice, instructions, SAMPLE_RATE, pcm)
+                return pcm
+            except Exception as e:
+                print(f"TTS retry {attempt}/{self.max_retries}: {e!r}")
+                # Backoff happens after the session is released; jitter keeps concurrent retries from lining up
+                await asyncio.sleep(2 ** attempt + random.uniform(0, 1))
+        raise TTSError("Max retries exceeded for TTS chunk.")
+
+    async def _synthesize(self, text, voice, instructions, max_chars, on_delta) -> List[bytes]:
+        return [await self._synthesize_chunk(chunk, voice, instructions, on_delta) for chunk in split_long_text(text, max_chars)]
+
+    # Returns raw 24 kHz mono s16 PCM, one entry per text chunk
+    async def synthesize(self, text: str, voice: str, instructions: str = VERBATIM_INSTRUCTIONS,
+                         max_chars: int = 1000, on_delta: Optional[Callable[[bytes], None]] = None) -> List[bytes]:
+        return await asyncio.wrap_future(self._submit(self._synthesize(text, voice, instructions, max_chars, on_delta)))
+
+    def synthesize_sync(self, text: str, voice: str, instructions: str = VERBATIM_INSTRUCTIONS,
+                        max_chars: int = 1000, on_delta: Optional[Callable[[bytes], None]] = None) -> List[bytes]:
+        return self._submit(self._synthesize(text, voice, instructions, max_chars, on_delta)).result()
+
+    def stats(self) -> str:
+        stats = f"{self.pool.connects} connects, {self.pool.reuses} reused sessions"
+        if self.cache is not None:
+            stats += f"; cache: {self.cache.stats()}"
+        return stats
+
+    def close(self):
+        if not self._loop.is_running():
+            return
+        self._submit(self.pool.close()).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
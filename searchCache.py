@@ -0,0 +1,133 @@
+import html
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+import requests
+
+# Web search with a TTL cache in front of one reused search client. Queries are normalized before
+# keying, so "Weather in Paris?" and "weather  in paris" share an entry. The pages behind the top
+# results are fetched in the background right after a search, so reading one of them in a follow-up
+# usually needs no network round trip. The backend is anything with DDGS's .text(query, max_results=)
+# and the page fetcher any url -> text function, so both can be stubbed out.
+
+def normalize_query(query: str) -> str:
+    return " ".join(re.sub(r"[^\w\s'\-\.]", " ", query.lower()).split()).strip(" .")
+
+def html_to_text(page: str) -> str:
+    page = re.sub(r"(?is)<(script|style|noscript)[^>]*>.*?</\1>", " ", page)
+    page = re.sub(r"(?s)<[^>]+>", " ", page)
+    return " ".join(html.unescape(page).split())
+
+def fetch_page(url: str, timeout: float = 10.0) -> str:
+    response = requests.get(url, timeout=timeout, headers={"User-Agent": "Mozilla/5.0 (Grapefruit assistant)"})
+    response.raise_for_status()
+    return html_to_text(response.text)
+
+class SearchCache:
+    def __init__(self, make_backend: Callable, ttl: float = 600.0, max_entries: int = 256, prefetch: int = 3,
+                 fetch: Callable[[str], str] = fetch_page, page_chars: int = 20000, debug: bool = False):
+        self._make_backend = make_backend
+        self._backend = None
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefetch = prefetch
+        self.fetch = fetch
+        self.page_chars = page_chars
+        self.debug = debug
+        self._results = OrderedDict()  # (normalized query, max_results) -> (expires, results)
+        self._pages = OrderedDict()  # url -> (expires, future of page text)
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch")
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+
+    def _log(self, message: str):
+        if self.debug:
+            print(f"Search cache: {message}")
+
+    # One client for the whole session; rebuilt only after it fails
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = self._make_backend()
+        return self._backend
+
+    def _store(self, cache: OrderedDict, key, value):
+        cache[key] = (time.monotonic() + self.ttl, value)
+        cache.move_to_end(key)
+        while len(cache) > self.max_entries:
+            cache.popitem(last=False)
+
+    def _cached(self, cache: OrderedDict, key):
+        entry = cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del cache[key]
+            return None
+        cache.move_to_end(key)
+        return entry[1]
+
+    def search(self, query: str, max_results: int = 3) -> list:
+        key = (normalize_query(query), max_results)
+        start = time.perf_counter()
+        with self._lock:
+            results = self._cached(self._results, key)
+        if results is not None:
+            self.hits += 1
+            source = "hit"
+        else:
+            try:
+                results = self.backend.text(query, max_results=max_results)
+            except Exception:
+                self._backend = None
+                raise
+            with self._lock:
+                self._store(self._results, key, results)
+            self.misses += 1
+            source = "miss"
+            for result in results[:self.prefetch]:
+                if result.get("href"):
+                    self.prefetch_page(result["href"])
+        spent = time.perf_counter() - start
+        self.lookup_seconds += spent
+        self._log(f"{source} for {key[0]!r} in {1000 * spent:.1f} ms ({self.stats()})")
+        return results
+
+    def _fetch(self, url: str) -> str:
+        return self.fetch(url)[:self.page_chars]
+
+    # Start fetching a page in the background unless it is cached or already on its way
+    def prefetch_page(self, url: str):
+        with self._lock:
+            if self._cached(self._pages, url) is None:
+                self._store(self._pages, url, self._pool.submit(self._fetch, url))
+
+    def page(self, url: str, timeout: float = 15.0) -> str:
+        start = time.perf_counter()
+        with self._lock:
+            future = self._cached(self._pages, url)
+        ready = future is not None and future.done()
+        if future is None:
+            self.prefetch_page(url)
+            with self._lock:
+                future = self._cached(self._pages, url)
+        try:
+            text = future.result(timeout=timeout)
+        except Exception:
+            with self._lock:
+                self._pages.pop(url, None)
+            raise
+        self._log(f"page {url} {'prefetched' if ready else 'fetched'} in {1000 * (time.perf_counter() - start):.1f} ms")
+        return text
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        if not lookups:
+            return "no lookups"
+        return (f"{self.hits}/{lookups} hits ({self.hits / lookups:.0%}), "
+                f"avg lookup {1000 * self.lookup_seconds / lookups:.1f} ms")
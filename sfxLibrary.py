@@ -0,0 +1,204 @@
+import argparse
+import difflib
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+from pydub import AudioSegment
+
+# On-disk library of generated sound effects, stored as FLAC and keyed by
+# (prompt, duration, num_inference_steps, seed, model id). Prompts are normalized before keying, so
+# "The door creaks." reuses "door creaks". Falling back to the closest similar prompt is opt-in: string
+# similarity cannot tell "glass breaking" from "grass breaking".
+# Effects from other generators (ElevenLabs, the realtime voice API) are imported with their own model id.
+LIBRARY_DIR = os.getenv("SFX_LIBRARY", os.path.join(os.path.expanduser("~"), ".cache", "sfx_library"))
+DEFAULT_MAX_MB = int(os.getenv("SFX_LIBRARY_MB", "1024"))
+FILLER_WORDS = {"a", "an", "the", "of", "sound", "sounds", "effect", "sfx"}
+
+def normalize_prompt(prompt: str) -> str:
+    words = re.sub(r"[^a-z0-9\s]", " ", prompt.lower()).split()
+    return " ".join(w for w in words if w not in FILLER_WORDS)
+
+def entry_id(prompt: str, duration: float, steps: int, seed: int, model: str) -> str:
+    key = json.dumps([normalize_prompt(prompt), round(float(duration), 2), int(steps), int(seed), model])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+class SFXLibrary:
+    def __init__(self, path: str = LIBRARY_DIR, max_mb: int = DEFAULT_MAX_MB):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self.index_path = os.path.join(path, "index.json")
+        self._refresh()
+
+    def _read_index(self) -> dict:
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    # Several processes can share the library (soundEffects11, soundEffectTest, audioDrama's SFX worker),
+    # so every change re-reads index.json under an exclusive file lock, applies itself to what is on disk
+    # and writes it back before the lock is released. Callers hold self._lock.
+    @contextmanager
+    def _locked_index(self, write: bool = True):
+        with open(self.index_path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            self.index = self._read_index()
+            yield self.index
+            if write:
+                self._save_index()
+
+    # Pick up effects stored by other processes since the index was last read
+    def _refresh(self):
+        with self._locked_index(write=False):
+            pass
+
+    def _save_index(self):
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def _load(self, eid: str, duration: Optional[float] = None) -> Optional[AudioSegment]:
+        try:
+            segment = AudioSegment.from_file(os.path.join(self.path, self.index[eid]["file"]), format="flac")
+        except FileNotFoundError:
+            segment = None
+        with self._locked_index() as index:
+            if eid in index:
+                if segment is None:
+                    del index[eid]
+                else:
+                    index[eid]["last_used"] = time.time()
+        if segment is None:
+            return None
+        return segment[:int(duration * 1000)] if duration else segment
+
+    # Exact match first; then, if fuzzy > 0, the most similar prompt of the same model and length.
+    # With any_source, effects of any model that are at least that long also count (with fuzzy == 0
+    # only for the same normalized prompt), trimmed to the requested duration.
+    def lookup(self, prompt: str, duration: float, steps: int = 20, seed: int = 0, model: str = "",
+               fuzzy: float = 0.0, any_source: bool = False) -> Optional[AudioSegment]:
+        with self._lock:
+            self._refresh()
+            eid = entry_id(prompt, duration, steps, seed, model)
+            if eid in self.index:
+                segment = self._load(eid)
+                if segment is not None:
+                    self.hits += 1
+                    return segment
+            if fuzzy > 0 or any_source:
+                wanted = normalize_prompt(prompt)
+                best, best_score = None, fuzzy if fuzzy > 0 else 1.0
+                for other_id, entry in self.index.items():
+                    if any_source:
+                        # Entries from before "length" was recorded only have their key duration
+                        if entry.get("length", entry["duration"]) < duration:
+                            continue
+                    elif entry["model"] != model or entry["duration"] != round(float(duration), 2) or entry["steps"] != steps:
+                        continue
+                    score = difflib.SequenceMatcher(None, wanted, entry["norm"]).ratio()
+                    if score >= best_score:
+                        best, best_score = other_id, score
+                if best is not None:
+                    best_prompt = self.index[best]["prompt"]
+                    segment = self._load(best, duration)
+                    if segment is not None:
+                        print(f"SFX library: using '{best_prompt}' for '{prompt}' ({best_score:.2f} match)")
+                        self.fuzzy_hits += 1
+                        return segment
+            self.misses += 1
+            return None
+
+    def store(self, prompt: str, segment: AudioSegment, duration: float, steps: int = 0, seed: int = 0,
+              model: str = "", source: str = "") -> str:
+        eid = entry_id(prompt, duration, steps, seed, model)
+        filename = eid + ".flac"
+        tmp_path = os.path.join(self.path, f"{filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            segment.export(tmp_path, format="flac").close()
+            os.replace(tmp_path, os.path.join(self.path, filename))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock, self._locked_index() as index:
+            index[eid] = {
+                "prompt": prompt, "norm": normalize_prompt(prompt), "duration": round(float(duration), 2),
+                "length": round(segment.duration_seconds, 2),
+                "steps": int(steps), "seed": int(seed), "model": model, "source": source or model,
+                "file": filename, "size": os.path.getsize(os.path.join(self.path, filename)), "last_used": time.time(),
+            }
+            self._evict(self.max_bytes)
+        return eid
+
+    def import_file(self, path: str, prompt: str, model: str, duration: Optional[float] = None, source: str = "") -> str:
+        segment = AudioSegment.from_file(path)
+        return self.store(prompt, segment, duration or round(segment.duration_seconds, 2), model=model, source=source or path)
+
+    # Drop least recently used effects until the library fits in max_bytes
+    def _evict(self, max_bytes: int) -> int:
+        total = sum(entry["size"] for entry in self.index.values())
+        removed = 0
+        for eid, entry in sorted(self.index.items(), key=lambda item: item[1]["last_used"]):
+            if total <= max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.path, entry["file"]))
+            except FileNotFoundError:
+                pass
+            total -= entry["size"]
+            del self.index[eid]
+            removed += 1
+        return removed
+
+    def prune(self, max_bytes: int) -> int:
+        with self._lock, self._locked_index():
+            removed = self._evict(max_bytes)
+        return removed
+
+    def stats(self) -> str:
+        size = sum(entry["size"] for entry in self.index.values())
+        return f"{len(self.index)} effects ({size / 1e6:.1f} MB); {self.hits} hits, {self.fuzzy_hits} fuzzy hits, {self.misses} misses"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the shared sound effect library")
+    parser.add_argument("--dir", default=LIBRARY_DIR, help="Library directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List stored effects")
+    search_parser = sub.add_parser("search", help="Find the closest stored effects to a prompt")
+    search_parser.add_argument("prompt")
+    import_parser = sub.add_parser("import", help="Add an existing audio file (e.g. ElevenLabs output)")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--prompt", required=True)
+    import_parser.add_argument("--model", default="elevenlabs", help="Generator id stored with the effect")
+    import_parser.add_argument("--duration", type=float, help="Defaults to the file length")
+    prune_parser = sub.add_parser("prune", help="Evict least recently used effects down to a size")
+    prune_parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB)
+    args = parser.parse_args()
+
+    library = SFXLibrary(args.dir)
+    if args.command == "list":
+        for entry in sorted(library.index.values(), key=lambda e: e["prompt"]):
+            print(f"{entry.get('length', entry['duration']):5.1f}s  {entry['model']:<24} {entry['prompt']}")
+        print(library.stats())
+    elif args.command == "search":
+        wanted = normalize_prompt(args.prompt)
+        scored = sorted(((difflib.SequenceMatcher(None, wanted, e["norm"]).ratio(), e) for e in library.index.values()),
+                        key=lambda pair: pair[0], reverse=True)
+        for score, entry in scored[:10]:
+            print(f"{score:.2f}  {entry.get('length', entry['duration']):5.1f}s  {entry['model']:<24} {entry['prompt']}")
+    elif args.command == "import":
+        print(f"Stored {library.import_file(args.file, args.prompt, args.model, args.duration)}")
+    elif args.command == "prune":
+        print(f"Removed {library.prune(args.max_mb * 1024 * 1024)} effects")
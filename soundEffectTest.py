@@ -1,98 +1,40 @@
 import os
-import io
 import asyncio
-import websockets
-import json
-import base64
 from pydub import AudioSegment
-
-async def generate_sound_effect(prompt: str, api_key: str, voice: str = "mara") -> AudioSegment:
-    uri = "wss://api.x.ai/v1/realtime"
-    audio_data = b""
-    retry_count = 0
-    max_retries = 3
-    while retry_count < max_retries:
-        try:
-            async with websockets.connect(uri, additional_headers={"Authorization": f"Bearer {api_key}"}) as websocket:
-                # Initial recv to establish connection
-                await websocket.recv()
-
-                # Set up session for sound effects
-                session_message = {
-                    "type": "session.update",
-                    "session": {
-                        "instructions": (
-                            "You are a sound effect generator. Interpret the input text as a description of a sound effect "
-                            "and produce the corresponding audio. Use vocalizations, onomatopoeia, or imitations to create "
-                            "the sound. Do not add any spoken words or explanations unless part of the effect. Output only "
-                            "the audio of the sound effect."
-                        ),
-                        "turn_detection": {"type": None},
-                        "audio": {
-                            "output": {
-                                "format": {"type": "audio/pcm", "rate": 24000}
-                            }
-                        },
-                        "voice": voice
-                    }
-                }
-                await websocket.send(json.dumps(session_message))
-
-                # Wait for session updated
-                while True:
-                    msg = await websocket.recv()
-                    data = json.loads(msg)
-                    if data["type"] == "session.updated":
-                        break
-                    elif data["type"] == "error":
-                        print("Session error:", data)
-                        raise Exception("Session update error")
-
-                # Send the prompt as input text
-                text_input = {
-                    "type": "conversation.item.create",
-                    "item": {
-                        "type": "message",
-                        "role": "user",
-                        "content": [{"type": "input_text", "text": prompt}]
-                    }
-                }
-                await websocket.send(json.dumps(text_input))
-
-                # Trigger response generation
-                generate_message = {"type": "response.create", "response": {}}
-                await websocket.send(json.dumps(generate_message))
-
-                # Collect audio deltas
-                while True:
-                    msg = await websocket.recv()
-                    data = json.loads(msg)
-                    if data["type"] == "response.output_audio.delta":
-                        audio_data += base64.b64decode(data["delta"])
-                    elif data["type"] == "response.output_audio.done":
-                        break
-                    elif data["type"] == "error":
-                        print("Audio error:", data)
-                        raise Exception("Audio generation error")
-
-                print("Sound effect generated successfully.")
-                break
-        except Exception as e:
-            retry_count += 1
-            print(f"Generation failed: {e}. Retrying {retry_count}/{max_retries}")
-            await asyncio.sleep(2 ** retry_count)
-
-    if retry_count >= max_retries or not audio_data:
+from realtimeTTS import TTSClient, TTSError, pcm_to_segment
+from sfxLibrary import SFXLibrary
+
+SFX_INSTRUCTIONS = (
+    "You are a sound effect generator. Interpret the input text as a description of a sound effect "
+    "and produce the corresponding audio. Use vocalizations, onomatopoeia, or imitations to create "
+    "the sound. Do not add any spoken words or explanations unless part of the effect. Output only "
+    "the audio of the sound effect."
+)
+
+async def generate_sound_effect(prompt: str, tts: TTSClient, voice: str = "mara", library: SFXLibrary = None) -> AudioSegment:
+    # Realtime voice effects vary in length, so they are keyed with duration 0 and the voice as model id;
+    # the library records their real length, which is what --sfx-any-source lookups compare against
+    model = f"grok-realtime-{voice}"
+    if library is not None:
+        cached = library.lookup(prompt, 0, steps=0, model=model)
+        if cached is not None:
+            print("Sound effect loaded from SFX library.")
+            return cached
+    try:
+        audio_data = b"".join(await tts.synthesize(prompt, voice, SFX_INSTRUCTIONS, max_chars=max(len(prompt), 1)))
+    except TTSError as e:
+        print(f"Generation failed: {e}")
+        audio_data = b""
+
+    if not audio_data:
         print("Failed to generate sound effect after retries.")
         return AudioSegment.empty()
 
+    print("Sound effect generated successfully.")
     # Convert raw audio to AudioSegment
-    segment = AudioSegment.from_raw(
-        io.BytesIO(audio_data),
-        sample_width=2,
-        frame_rate=24000,
-        channels=1
-    )
+    segment = pcm_to_segment(audio_data)
+    if library is not None:
+        library.store(prompt, segment, 0, model=model, source="soundEffectTest")
     return segment
 
 async def main():
@@ -105,7 +47,8 @@ async def main():
     test_prompt = "Make a realistic explosion sound: Boom! Kaboom!"
 
     # Generate and save
-    audio = await generate_sound_effect(test_prompt, api_key)
+    with TTSClient(api_key) as tts:
+        audio = await generate_sound_effect(test_prompt, tts, library=SFXLibrary())
     if len(audio) > 0:
         audio.export("test_sound_effect.wav", format="wav")
         print("Saved to test_sound_effect.wav")
@@ -1,12 +1,23 @@
 import os
 from elevenlabs.client import ElevenLabs
 from elevenlabs import save
+from sfxLibrary import SFXLibrary
+
+ELEVENLABS_MODEL_ID = "elevenlabs-sfx"
 
 def generate_sfx(prompt: str, duration_seconds: int = 5, output_file: str = "sfx_output.mp3"):
     api_key = os.environ.get("ELEVENLABS_KEY")
     if not api_key:
         raise ValueError("ELEVENLABS_KEY environment variable is required")
 
+    # Reuse the effect if this exact prompt and length is already in the shared SFX library
+    library = SFXLibrary()
+    cached = library.lookup(prompt, duration_seconds, steps=0, model=ELEVENLABS_MODEL_ID)
+    if cached is not None:
+        cached.export(output_file, format="mp3").close()
+        print(f"SFX library hit, saved to {output_file}")
+        return
+
     client = ElevenLabs(api_key=api_key)
     
     try:
@@ -17,6 +28,7 @@ def generate_sfx(prompt: str, duration_seconds: int = 5, output_file: str = "sfx
         )
         save(audio, output_file)
         print(f"Generated SFX saved to {output_file}")
+        library.import_file(output_file, prompt, ELEVENLABS_MODEL_ID, duration_seconds, source=output_file)
     except Exception as e:
         print(f"Error generating SFX: {e}")
 
@@ -0,0 +1,137 @@
+import queue
+import re
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+from realtimeTTS import SAMPLE_RATE, TTSClient, TTSError, VERBATIM_INSTRUCTIONS
+
+# Low-latency spoken replies: chat tokens are streamed, every sentence is sent to TTS as soon as it is
+# complete, and audio deltas go straight to an output stream while later sentences are still being
+# written by the model. The first words play after one sentence instead of after the whole reply.
+
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+# Collects streamed text and hands back sentences once they are complete
+class SentenceBuffer:
+    def __init__(self):
+        self._text = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._text += text
+        parts = SENTENCE_END.split(self._text)
+        self._text = parts.pop()
+        return [part.strip() for part in parts if part.strip()]
+
+    def flush(self) -> str:
+        text, self._text = self._text.strip(), ""
+        return text
+
+# Writes PCM to a blocking output stream (e.g. a pyaudio output stream) from its own thread,
+# so synthesis never waits on the sound card
+class PCMPlayer:
+    def __init__(self, stream, sample_rate: int = SAMPLE_RATE):
+        self.stream = stream
+        self.sample_rate = sample_rate
+        self.first_audio_at = None
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="pcm-player", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            pcm = self._queue.get()
+            try:
+                if pcm is None:
+                    return
+                if self.first_audio_at is None:
+                    self.first_audio_at = time.perf_counter()
+                self.stream.write(pcm)
+            finally:
+                self._queue.task_done()
+
+    def write(self, pcm: bytes):
+        if pcm:
+            self._queue.put(pcm)
+
+    # Start timing a new reply
+    def reset(self):
+        self.first_audio_at = None
+
+    # Block until everything queued so far has been written to the stream
+    def drain(self):
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+# Speaks streamed text sentence by sentence. Sentences are synthesized one after another on a worker
+# thread, so audio stays in order while the next sentence is requested as soon as the previous one ends.
+class ReplySpeaker:
+    def __init__(self, tts: TTSClient, player: PCMPlayer, voice: str = "ara", instructions: str = VERBATIM_INSTRUCTIONS):
+        self.tts = tts
+        self.player = player
+        self.voice = voice
+        self.instructions = instructions
+        self._buffer = SentenceBuffer()
+        self._sentences = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="reply-speaker", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            text = self._sentences.get()
+            try:
+                if text is None:
+                    return
+                self.tts.synthesize_sync(text, self.voice, self.instructions, on_delta=self.player.write)
+            except TTSError as e:
+                print(f"TTS failed: {e}")
+            finally:
+                self._sentences.task_done()
+
+    def say(self, text: str):
+        if text and text.strip():
+            self._sentences.put(text.strip())
+
+    # Streaming callback for chat tokens
+    def feed(self, text: str):
+        for sentence in self._buffer.feed(text):
+            self.say(sentence)
+
+    # Speak whatever is left of the reply and wait until it has played
+    def finish(self):
+        self.say(self._buffer.flush())
+        self._sentences.join()
+        self.player.drain()
+
+    def close(self):
+        self._sentences.put(None)
+        self._thread.join()
+
+# Run one streamed chat completion. Text deltas go to on_text as they arrive; tool calls are
+# reassembled from their fragments and returned in assistant-message form with the full text.
+def stream_chat(client, messages: list, tools: Optional[list] = None, model: str = "grok-4-1-fast",
+                on_text: Optional[Callable[[str], None]] = None) -> Tuple[str, list]:
+    request = {"model": model, "messages": messages, "stream": True}
+    if tools:
+        request["tools"] = tools
+    content = []
+    calls = {}
+    for chunk in client.chat.completions.create(**request):
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta
+        if delta.content:
+            content.append(delta.content)
+            if on_text:
+                on_text(delta.content)
+        for call in delta.tool_calls or []:
+            entry = calls.setdefault(call.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+            if call.id:
+                entry["id"] = call.id
+            if call.function and call.function.name:
+                entry["function"]["name"] += call.function.name
+            if call.function and call.function.arguments:
+                entry["function"]["arguments"] += call.function.arguments
+    return "".join(content), [calls[index] for index in sorted(calls)]
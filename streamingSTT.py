@@ -0,0 +1,75 @@
+import threading
+import time
+from voiceActivity import SAMPLE_RATE, pcm_to_float32
+
+# Incremental transcription while the user is still talking. A worker thread re-decodes the growing
+# speech buffer every `interval` seconds; words on which two consecutive decodes agree are committed
+# (local agreement), so the partial transcript only ever grows. Once the endpointer stops, the last
+# decode usually already covers all of the speech (it keeps running through the trailing silence),
+# and the final transcript is ready without another full pass.
+class StreamingTranscriber:
+    def __init__(self, stt, sample_rate: int = SAMPLE_RATE, interval: float = 0.5, min_seconds: float = 0.8,
+                 language: str = None):
+        self.stt = stt
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.min_samples = int(sample_rate * min_seconds)
+        self.language = language
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        self._pcm = bytearray()
+        self._previous = []
+        self.committed = []
+        self._hypothesis = None
+        self._decoded = 0
+        self.decodes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="partial-stt", daemon=True)
+        self._thread.start()
+
+    # Frame callback for Endpointer.record
+    def add(self, pcm: bytes):
+        with self._lock:
+            self._pcm += pcm
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                pcm = bytes(self._pcm)
+            samples = len(pcm) // 2
+            if samples < self.min_samples or samples - self._decoded < self.sample_rate * self.interval / 2:
+                continue
+            text = self.stt.transcribe(pcm_to_float32(pcm), self.language)
+            self.decodes += 1
+            self._update(text, samples)
+
+    def _update(self, text: str, samples: int):
+        words = text.split()
+        agreed = 0
+        while agreed < min(len(words), len(self._previous)) and words[agreed] == self._previous[agreed]:
+            agreed += 1
+        if agreed > len(self.committed):
+            self.committed = words[:agreed]
+            print(f"Partial: {' '.join(self.committed)}")
+        self._previous = words
+        self._hypothesis = text
+        self._decoded = samples
+
+    # Stop decoding and return the final transcript of `speech`. The last partial decode is reused when it
+    # covered all of the endpointed speech (which already ends in a short silence); otherwise one final pass is run.
+    def finish(self, speech: bytes, tolerance_ms: float = 0) -> str:
+        start = time.perf_counter()
+        self._stop.set()
+        self._thread.join()
+        total = len(speech) // 2
+        if self._hypothesis is not None and self._decoded >= total - self.sample_rate * tolerance_ms / 1000:
+            text, source = self._hypothesis.strip(), "partial"
+        elif total:
+            text, source = self.stt.transcribe(pcm_to_float32(speech), self.language), "final pass"
+        else:
+            text, source = "", "no speech"
+        print(f"Transcript ready {1000 * (time.perf_counter() - start):.0f} ms after end of speech "
+              f"({source}, {self.decodes} partial decodes)")
+        return text
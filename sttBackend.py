@@ -0,0 +1,43 @@
+import os
+import numpy as np
+
+# Speech-to-text backends behind one interface: transcribe(16 kHz float32 mono samples) -> text.
+# "whisper" is openai-whisper in float32 (slow to load and run on CPU); "faster-whisper" runs the same
+# models through CTranslate2 with int8 weights, which is several times faster on machines without a GPU.
+# Pick one with --stt / --stt-model or the GRAPEFRUIT_STT / GRAPEFRUIT_STT_MODEL environment variables.
+
+DEFAULT_BACKEND = os.getenv("GRAPEFRUIT_STT", "whisper")
+DEFAULT_MODEL = os.getenv("GRAPEFRUIT_STT_MODEL", "large-v3-turbo")
+BACKENDS = ["whisper", "faster-whisper"]
+
+class WhisperBackend:
+    name = "whisper"
+
+    def __init__(self, model: str = DEFAULT_MODEL, device: str = "cpu"):
+        import whisper
+        self.model_name = model
+        self.model = whisper.load_model(model, device=device)
+        self.fp16 = device != "cpu"
+
+    def transcribe(self, audio: np.ndarray, language: str = None) -> str:
+        return self.model.transcribe(audio, language=language, fp16=self.fp16)["text"].strip()
+
+class FasterWhisperBackend:
+    name = "faster-whisper"
+
+    def __init__(self, model: str = DEFAULT_MODEL, device: str = "cpu", compute_type: str = "int8", beam_size: int = 1):
+        from faster_whisper import WhisperModel
+        self.model_name = model
+        self.model = WhisperModel(model, device=device, compute_type=compute_type)
+        self.beam_size = beam_size
+
+    def transcribe(self, audio: np.ndarray, language: str = None) -> str:
+        segments, _ = self.model.transcribe(audio, language=language, beam_size=self.beam_size)
+        return "".join(segment.text for segment in segments).strip()
+
+def make_stt(backend: str = DEFAULT_BACKEND, model: str = DEFAULT_MODEL, device: str = "cpu"):
+    if backend == "faster-whisper":
+        return FasterWhisperBackend(model, device)
+    if backend == "whisper":
+        return WhisperBackend(model, device)
+    raise ValueError(f"Unknown STT backend {backend!r}, expected one of {BACKENDS}")
@@ -0,0 +1,121 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from typing import Optional
+
+# On-disk cache of raw 24 kHz PCM per TTS chunk, addressed by a hash of everything that shapes the audio.
+# Recency is tracked through file mtimes, which are bumped on every hit, so eviction is least-recently-used.
+CACHE_DIR = os.getenv("GROK_TTS_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "grok_tts"))
+DEFAULT_MAX_MB = int(os.getenv("GROK_TTS_CACHE_MB", "2048"))
+
+def cache_key(text: str, voice: str, instructions: str, sample_rate: int) -> str:
+    return hashlib.sha256(json.dumps([text, voice, instructions, sample_rate]).encode("utf-8")).hexdigest()
+
+class TTSCache:
+    def __init__(self, path: str = CACHE_DIR, max_mb: int = DEFAULT_MAX_MB):
+        self.path = path
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.path, exist_ok=True)
+        self._size = sum(size for _, size, _ in self.entries())
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key + ".pcm")
+
+    def get(self, text: str, voice: str, instructions: str, sample_rate: int) -> Optional[bytes]:
+        path = self._file(cache_key(text, voice, instructions, sample_rate))
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, text: str, voice: str, instructions: str, sample_rate: int, pcm: bytes):
+        if not pcm:
+            return
+        path = self._file(cache_key(text, voice, instructions, sample_rate))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pcm)
+        with self._lock:
+            # Rewriting an existing entry replaces its bytes rather than adding to them
+            try:
+                old_size = os.path.getsize(path)
+            except FileNotFoundError:
+                old_size = 0
+            os.replace(tmp_path, path)
+            self._size += len(pcm) - old_size
+            over = self._size > self.max_bytes
+        if over:
+            self.prune()
+
+    def entries(self):
+        found = []
+        for root, _, files in os.walk(self.path):
+            for name in files:
+                if name.endswith(".pcm"):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    found.append((path, st.st_size, st.st_mtime))
+        return found
+
+    # Evict least recently used entries until the cache fits in max_bytes
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        entries = sorted(self.entries(), key=lambda e: e[2])
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        with self._lock:
+            self._size = total
+        return removed
+
+    def clear(self) -> int:
+        return self.prune(0)
+
+    def stats(self) -> str:
+        lookups = self.hits + self.misses
+        rate = f"{100 * self.hits / lookups:.0f}%" if lookups else "n/a"
+        return f"{self.hits} hits, {self.misses} misses ({rate} hit rate), {self._size / 1e6:.1f} MB cached"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and prune the TTS audio cache")
+    parser.add_argument("--dir", default=CACHE_DIR, help="Cache directory")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats", help="Show entry count and size")
+    prune_parser = sub.add_parser("prune", help="Evict least recently used entries down to a size")
+    prune_parser.add_argument("--max-mb", type=int, default=DEFAULT_MAX_MB)
+    sub.add_parser("clear", help="Delete every entry")
+    args = parser.parse_args()
+
+    cache = TTSCache(args.dir)
+    if args.command == "stats":
+        entries = cache.entries()
+        seconds = sum(size for _, size, _ in entries) / 2 / 24000
+        print(f"{args.dir}: {len(entries)} chunks, {cache._size / 1e6:.1f} MB, about {seconds / 60:.1f} minutes of audio")
+    elif args.command == "prune":
+        print(f"Removed {cache.prune(args.max_mb * 1024 * 1024)} chunks")
+    elif args.command == "clear":
+        print(f"Removed {cache.clear()} chunks")
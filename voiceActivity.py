@@ -0,0 +1,122 @@
+import collections
+import math
+from typing import Callable
+import numpy as np
+
+# Voice activity detection and endpointing for the microphone after the wake word. Recording stops
+# once the speaker has been quiet for `trailing_silence_ms`, or at `max_seconds`, and only the speech
+# (plus a short pre-roll so the first syllable is not clipped) is returned for transcription.
+
+SAMPLE_RATE = 16000
+
+def frame_dbfs(pcm: bytes) -> float:
+    samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16).astype(np.float32)
+    if not len(samples):
+        return -math.inf
+    rms = math.sqrt(float(np.mean(samples ** 2)))
+    return 20 * math.log10(rms / 32768.0) if rms else -math.inf
+
+# int16 PCM to the float32 [-1, 1) array Whisper-style models take directly
+def pcm_to_float32(pcm: bytes) -> np.ndarray:
+    return np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype=np.int16).astype(np.float32) / 32768.0
+
+# Frame energy against an adaptive noise floor: speech is anything `margin_db` above the floor
+# (and above `min_db`); the floor follows the background level while nobody is talking. It starts
+# low, so an utterance already under way on the first frame still counts as speech, and during a
+# recording it only follows quiet frames, so it cannot climb to speech level. calibrate() is fed the
+# frames read while waiting for the wake word, so a noisy room is learned before recording starts;
+# there it rises slowly (the wake word itself is in those frames) and at most to `min_db + 2 * margin_db`.
+class EnergyVAD:
+    def __init__(self, margin_db: float = 10.0, min_db: float = -50.0, adapt: float = 0.05):
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.adapt = adapt
+        self.floor = min_db - margin_db
+
+    def calibrate(self, pcm: bytes):
+        level = min(max(frame_dbfs(pcm), -100.0), self.min_db + 2 * self.margin_db)
+        rate = self.adapt if level < self.floor else self.adapt / 10
+        self.floor += rate * (level - self.floor)
+
+    def is_speech(self, pcm: bytes) -> bool:
+        level = max(frame_dbfs(pcm), -100.0)
+        speech = level > max(self.floor + self.margin_db, self.min_db)
+        if not speech and level < self.min_db + self.margin_db:
+            self.floor += self.adapt * (level - self.floor)
+        return speech
+
+# WebRTC's small GMM voice model (pip install webrtcvad). It only takes 10/20/30 ms frames, so
+# each frame is split into 30 ms windows and counts as speech if most of them are.
+class WebRTCVAD:
+    def __init__(self, aggressiveness: int = 2, sample_rate: int = SAMPLE_RATE):
+        import webrtcvad
+        self.vad = webrtcvad.Vad(aggressiveness)
+        self.sample_rate = sample_rate
+        self.window = sample_rate * 30 // 1000 * 2
+        self._pending = b""
+
+    def calibrate(self, pcm: bytes):
+        pass
+
+    def is_speech(self, pcm: bytes) -> bool:
+        data = self._pending + pcm
+        count = len(data) // self.window
+        self._pending = data[count * self.window:]
+        if not count:
+            return False
+        votes = sum(self.vad.is_speech(data[i * self.window:(i + 1) * self.window], self.sample_rate) for i in range(count))
+        return votes * 2 >= count
+
+def make_vad(kind: str = "energy", aggressiveness: int = 2, sample_rate: int = SAMPLE_RATE):
+    if kind == "webrtc":
+        return WebRTCVAD(aggressiveness, sample_rate)
+    return EnergyVAD()
+
+class Endpointer:
+    def __init__(self, vad=None, sample_rate: int = SAMPLE_RATE, trailing_silence_ms: float = 700,
+                 max_seconds: float = 10.0, no_speech_seconds: float = 4.0, pre_roll_ms: float = 300,
+                 min_speech_ms: float = 90):
+        self.vad = vad or EnergyVAD()
+        self.sample_rate = sample_rate
+        self.trailing_silence_ms = trailing_silence_ms
+        self.max_seconds = max_seconds
+        self.no_speech_seconds = no_speech_seconds
+        self.pre_roll_ms = pre_roll_ms
+        self.min_speech_ms = min_speech_ms
+
+    # Read frames until the utterance ends. Returns the speech PCM (empty if nobody spoke) and why it stopped.
+    # on_speech, if given, receives every frame from the start of speech on while recording is still going.
+    def record(self, read_frame: Callable[[], bytes], on_speech: Callable[[bytes], None] = None):
+        frame = read_frame()
+        frame_ms = 1000 * len(frame) / 2 / self.sample_rate
+        pre_roll = collections.deque(maxlen=max(1, int(self.pre_roll_ms / frame_ms)))
+        start_frames = max(1, math.ceil(self.min_speech_ms / frame_ms))
+        keep_silence = max(1, int(200 / frame_ms))  # Trailing silence kept so the last word decays naturally
+        frames = []
+        voiced_run = 0
+        silent_run = 0
+        elapsed = 0.0
+        while True:
+            speech = self.vad.is_speech(frame)
+            elapsed += frame_ms
+            if not frames:
+                pre_roll.append(frame)
+                voiced_run = voiced_run + 1 if speech else 0
+                if voiced_run >= start_frames:
+                    frames = list(pre_roll)
+                    if on_speech:
+                        for earlier in frames:
+                            on_speech(earlier)
+                elif elapsed >= 1000 * self.no_speech_seconds:
+                    return b"", "no speech"
+            else:
+                frames.append(frame)
+                if on_speech:
+                    on_speech(frame)
+                silent_run = 0 if speech else silent_run + 1
+                if silent_run * frame_ms >= self.trailing_silence_ms:
+                    frames = frames[:len(frames) - silent_run + keep_silence]
+                    return b"".join(frames), "end of speech"
+            if elapsed >= 1000 * self.max_seconds:
+                return b"".join(frames), "max length"
+            frame = read_frame()
@@ -1,5 +1,8 @@
-import whisper  # Or from faster_whisper import WhisperModel for optimized
+from pydub import AudioSegment
+from sttBackend import DEFAULT_BACKEND, DEFAULT_MODEL, make_stt
+from voiceActivity import pcm_to_float32
 
-model = whisper.load_model("large-v3-turbo", device="cpu")  # Downloads ~3GB on first run
-result = model.transcribe("output.wav", language="en")  # Or multilingual auto-detect
-print(result["text"])
\ No newline at end of file
+# Backend and model follow GRAPEFRUIT_STT / GRAPEFRUIT_STT_MODEL (e.g. GRAPEFRUIT_STT=faster-whisper for int8 on CPU)
+model = make_stt(DEFAULT_BACKEND, DEFAULT_MODEL)  # Downloads the model on first run
+segment = AudioSegment.from_file("output.wav").set_frame_rate(16000).set_channels(1).set_sample_width(2)
+print(model.transcribe(pcm_to_float32(segment.raw_data), language="en"))  # Or language=None to auto-detect